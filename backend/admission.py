@@ -0,0 +1,196 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+
+def describe_bytes(size: int) -> str:
+    """``size`` in whole MiB when it is one, in bytes otherwise."""
+    mib = 1024 * 1024
+    return f"{size // mib} MiB" if size % mib == 0 else f"{size:,} bytes"
+
+
+class Saturated(Exception):
+    """No room for another job right now; the client should retry after ``retry_after`` seconds."""
+
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def client_key(scope, header: str = "x-client-id") -> str:
+    """Who a request is from, for fair queuing: the client id header if sent, else the peer address."""
+    name = header.lower().encode("latin-1")
+    for key, value in scope.get("headers", ()):
+        if key == name and value.strip():
+            return value.decode("latin-1").strip()[:128]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionController:
+    """Admission control and fair scheduling of jobs.
+
+    ``check`` refuses a new job once ``max_queued`` jobs are already waiting,
+    or once its client has ``max_queued_per_client`` waiting. For jobs run in
+    this process, at most ``max_running`` run at once and the rest wait in one
+    line per client; lines are served round-robin, so one client's burst
+    cannot hold everyone else back. Waits and Retry-After are estimated from a
+    running average of job durations.
+    """
+
+    def __init__(self, max_running: int, max_queued: int, max_queued_per_client: int, job_seconds: float = 120.0, smoothing: float = 0.2):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.job_seconds = job_seconds
+        self.smoothing = smoothing
+        self._running: Dict[str, str] = {}  # job id -> client
+        self._waiting: Dict[str, str] = {}  # job id -> client
+        self._lines: "OrderedDict[str, Deque[str]]" = OrderedDict()  # client -> waiting job ids, in serving order
+        self._ready: Dict[str, asyncio.Event] = {}
+
+    def observe(self, seconds: float) -> None:
+        """Fold a finished job's duration into the running average."""
+        self.job_seconds += self.smoothing * (seconds - self.job_seconds)
+
+    def calibrate(self, seconds: Optional[float]) -> None:
+        """Take the average job duration from elsewhere, e.g. jobs finished by worker processes."""
+        if seconds:
+            self.job_seconds = seconds
+
+    def retry_after(self, capacity: int) -> int:
+        """Seconds until a slot is likely to free up, with ``capacity`` jobs running side by side."""
+        return max(1, math.ceil(self.job_seconds / max(capacity, 1)))
+
+    def wait_seconds(self, position: int, capacity: int) -> int:
+        """Estimated seconds until the job at ``position`` (0 = next) starts."""
+        return math.ceil(self.job_seconds * (position + 1) / max(capacity, 1))
+
+    def check(self, queued: int, client_queued: int, capacity: int) -> None:
+        """Raise Saturated if one more job cannot be queued."""
+        if queued >= self.max_queued:
+            raise Saturated(f"Server is busy: {queued} jobs are already waiting", self.retry_after(capacity))
+        if client_queued >= self.max_queued_per_client:
+            raise Saturated(f"You already have {client_queued} jobs waiting", self.retry_after(capacity))
+
+    def backlog(self, client: str) -> Tuple[int, int, int]:
+        """``(waiting, running, waiting for client)`` for jobs run in this process."""
+        return len(self._waiting), len(self._running), len(self._lines.get(client, ()))
+
+    def enqueue(self, job_id: str, client: str) -> None:
+        """Line a job up to run; it starts right away if a slot is free."""
+        self._ready[job_id] = asyncio.Event()
+        self._waiting[job_id] = client
+        self._lines.setdefault(client, deque()).append(job_id)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while len(self._running) < self.max_running and self._lines:
+            client, line = next(iter(self._lines.items()))
+            job_id = line.popleft()
+            # The client goes to the back of the rotation, or leaves it if nothing else is waiting
+            if line:
+                self._lines.move_to_end(client)
+            else:
+                del self._lines[client]
+            del self._waiting[job_id]
+            self._running[job_id] = client
+            self._ready[job_id].set()
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Number of waiting jobs that will start before ``job_id``, or None if it is not waiting."""
+        client = self._waiting.get(job_id)
+        if client is None:
+            return None
+        turn = self._lines[client].index(job_id)
+        rotation = list(self._lines)
+        mine = rotation.index(client)
+        ahead = turn
+        # Every round starts one job per client in rotation order, so clients before ours get one more
+        for i, other in enumerate(rotation):
+            if other != client:
+                ahead += min(len(self._lines[other]), turn + 1 if i < mine else turn)
+        return ahead
+
+    def discard(self, job_id: str) -> None:
+        """Forget a job, waiting or running, and hand its slot on."""
+        client = self._waiting.pop(job_id, None)
+        if client is not None:
+            self._lines[client].remove(job_id)
+            if not self._lines[client]:
+                del self._lines[client]
+        self._running.pop(job_id, None)
+        self._ready.pop(job_id, None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, job_id: str):
+        """Wait for the queued job's turn, then hold a running slot for the duration of the block."""
+        try:
+            await self._ready[job_id].wait()
+            started = time.monotonic()
+            yield
+            self.observe(time.monotonic() - started)
+        finally:
+            self.discard(job_id)
+
+
+class UploadGate:
+    """ASGI middleware that guards upload routes before their bodies are read.
+
+    ``limits`` maps a path to the most upload bytes it accepts; the body may be
+    ``overhead_bytes`` larger for multipart framing and form fields. A request
+    for such a path is turned away with 429 and Retry-After when
+    ``await admit(client)`` raises Saturated, and with 413 when its Content-Length is
+    over the limit.
+    A body that streams past the limit without a Content-Length is cut off
+    with 413 as soon as it does, so oversized uploads are never spooled to
+    disk in full.
+    """
+
+    def __init__(self, app, limits: Dict[str, int], admit: Callable[[str], Awaitable[None]], client_header: str = "x-client-id", overhead_bytes: int = 1024 * 1024):
+        self.app = app
+        self.limits = limits
+        self.overhead_bytes = overhead_bytes
+        self.admit = admit
+        self.client_header = client_header
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" and scope.get("method") == "POST" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.admit(client_key(scope, self.client_header))
+        except Saturated as exc:
+            response = JSONResponse({"detail": exc.detail}, status_code=429, headers={"Retry-After": str(exc.retry_after)})
+            await response(scope, receive, send)
+            return
+        too_large = f"Upload exceeds the {describe_bytes(limit)} limit"
+        limit += self.overhead_bytes
+        length = dict(scope.get("headers", ())).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            await JSONResponse({"detail": too_large}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this becomes the response
+                    raise HTTPException(status_code=413, detail=too_large)
+            return message
+
+        await self.app(scope, limited_receive, send)
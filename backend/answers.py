@@ -0,0 +1,106 @@
+import random
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+LETTERS = ("A", "B", "C", "D")
+
+# Explicit references to an option letter: "(B)", "B)", "option B", "answer: B", "choice B"
+_LETTER_REFERENCE = re.compile(r"(?:\b(?i:option|answer|choice)\s*:?\s*\(?([ABCD])\b)|(?:\(([ABCD])\))|(?:(?<![\w(])([ABCD])\))")
+
+
+def _referenced_letter(explanation: str) -> Optional[str]:
+    match = _LETTER_REFERENCE.search(explanation)
+    if match is None:
+        return None
+    return next(group for group in match.groups() if group)
+
+
+def align_correct_answer(q: Dict[str, Any]) -> None:
+    """Point correct_answer at the option the explanation actually talks about.
+
+    An option whose text appears in the explanation wins; if several do, the
+    current answer is kept when it is one of them, otherwise the longest
+    (most specific) match is used. Failing that, an explicit reference such as
+    "(B)" or "option B" decides. Questions with nothing to go on are left alone.
+    """
+    try:
+        explanation = q['explanation']
+        explanation_lower = explanation.lower()
+        options = q['options']
+        matches = [letter for letter, text in options.items() if text and str(text).lower() in explanation_lower]
+        if matches:
+            matched_letter = q['correct_answer'] if q['correct_answer'] in matches else max(matches, key=lambda l: len(str(options[l])))
+        else:
+            matched_letter = _referenced_letter(explanation)
+        if matched_letter and matched_letter in options and matched_letter != q['correct_answer']:
+            q['correct_answer'] = matched_letter
+    except Exception:
+        # If anything fails here, keep the original correct answer
+        pass
+
+
+def align_answers(questions: Iterable[Dict[str, Any]]) -> None:
+    for q in questions:
+        align_correct_answer(q)
+
+
+def answer_counts(questions: Iterable[Dict[str, Any]], letters: Sequence[str] = LETTERS) -> Dict[str, int]:
+    counts = Counter(q.get('correct_answer') for q in questions)
+    return {letter: counts.get(letter, 0) for letter in letters}
+
+
+def balance_answers(questions: List[Dict[str, Any]], letters: Sequence[str] = LETTERS, seed: int = 0) -> int:
+    """Even out correct-answer letters with as few changes as possible. Returns how many questions moved.
+
+    Targets are n // len(letters) per letter, with the remainder going to the
+    letters that are already most common. Questions above a letter's target
+    are the only ones touched: each is moved to a letter still under target by
+    swapping the two option texts, so the question's content and every other
+    option stay where they were. Which surplus questions move is chosen with
+    a seeded shuffle, so runs are reproducible and moves are not clustered at
+    the start or end of the bank; questions whose explanation names a letter
+    ("option B") are moved last, since the swap would contradict it. Runs in
+    O(n).
+    """
+    n = len(questions)
+    if n < 2:
+        return 0
+    counts = answer_counts(questions, letters)
+    base, extra = divmod(n, len(letters))
+    by_count = sorted(letters, key=lambda l: (-counts[l], letters.index(l)))
+    target = {letter: base + (1 if rank < extra else 0) for rank, letter in enumerate(by_count)}
+
+    rng = random.Random(seed)
+    holders: Dict[str, List[int]] = {letter: [] for letter in letters}
+    for idx, q in enumerate(questions):
+        if q.get('correct_answer') in holders:
+            holders[q['correct_answer']].append(idx)
+
+    surplus: List[int] = []
+    for letter in letters:
+        over = counts[letter] - target[letter]
+        if over > 0:
+            candidates = holders[letter]
+            rng.shuffle(candidates)
+            names_letter = {idx: _referenced_letter(str(questions[idx].get('explanation', ''))) is not None for idx in candidates}
+            ordered = [idx for idx in candidates if not names_letter[idx]] + [idx for idx in candidates if names_letter[idx]]
+            surplus.extend(ordered[:over])
+    rng.shuffle(surplus)
+
+    deficit = {letter: target[letter] - counts[letter] for letter in letters if counts[letter] < target[letter]}
+    moved = 0
+    for idx in surplus:
+        q = questions[idx]
+        options = q['options']
+        current = q['correct_answer']
+        # Largest remaining deficit first, among letters this question actually offers
+        choices = [letter for letter in deficit if deficit[letter] > 0 and letter in options]
+        if not choices:
+            continue
+        new = max(choices, key=lambda l: (deficit[l], -letters.index(l)))
+        options[current], options[new] = options[new], options[current]
+        q['correct_answer'] = new
+        deficit[new] -= 1
+        moved += 1
+    return moved
@@ -0,0 +1,68 @@
+import math
+from typing import Dict, Tuple
+
+
+class BatchSizer:
+    """Sizes question batches from the completion tokens questions actually cost.
+
+    Keeps a running average of completion tokens per question for each
+    (model, language) pair, fed by ``observe`` after every generation call.
+    ``plan`` then picks the largest batch whose expected reply, plus
+    ``headroom``, fits the model's output limit, and the ``max_tokens`` to
+    request for it. A truncated reply raises the estimate, so the next batches
+    are smaller or get more room.
+    """
+
+    def __init__(
+        self,
+        output_limits: Dict[str, int],
+        default_output_limit: int = 4096,
+        prior_tokens_per_question: float = 160.0,
+        min_batch: int = 1,
+        max_batch: int = 15,
+        headroom: float = 1.3,
+        overhead_tokens: int = 32,
+        smoothing: float = 0.3,
+    ):
+        self.output_limits = output_limits
+        self.default_output_limit = default_output_limit
+        self.prior = prior_tokens_per_question
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.headroom = headroom
+        self.overhead_tokens = overhead_tokens
+        self.smoothing = smoothing
+        self._estimates: Dict[Tuple[str, str], float] = {}
+
+    def tokens_per_question(self, model: str, language: str) -> float:
+        return self._estimates.get((model, language.lower()), self.prior)
+
+    def observe(self, model: str, language: str, questions: int, completion_tokens: int, truncated: bool = False) -> None:
+        """Fold one reply into the estimate for ``(model, language)``."""
+        if completion_tokens <= 0:
+            return
+        key = (model, language.lower())
+        current = self._estimates.get(key, self.prior)
+        if questions > 0:
+            # A cut-off reply also spent tokens on the question it was in the middle of
+            sample = (completion_tokens - self.overhead_tokens) / (questions + (0.5 if truncated else 0.0))
+            sample = max(sample, 1.0)
+            estimate = current + self.smoothing * (sample - current)
+        else:
+            estimate = current
+        if truncated:
+            estimate = max(estimate, current * 1.25)
+        self._estimates[key] = estimate
+
+    def max_tokens(self, model: str, language: str, batch_size: int) -> int:
+        limit = self.output_limits.get(model, self.default_output_limit)
+        wanted = batch_size * self.tokens_per_question(model, language) * self.headroom + self.overhead_tokens
+        return min(limit, int(math.ceil(wanted)))
+
+    def plan(self, model: str, language: str, remaining: int) -> Tuple[int, int]:
+        """Return ``(batch_size, max_tokens)`` for the next batches of a job still needing ``remaining`` questions."""
+        limit = self.output_limits.get(model, self.default_output_limit)
+        per_question = self.tokens_per_question(model, language) * self.headroom
+        fits = int((limit - self.overhead_tokens) // per_question)
+        batch_size = max(self.min_batch, min(self.max_batch, fits, max(remaining, 1)))
+        return batch_size, self.max_tokens(model, language, batch_size)
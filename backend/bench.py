@@ -0,0 +1,359 @@
+"""Offline benchmarks for the generation pipeline.
+
+Runs the hot paths (chunking, dedupe, answer alignment and balancing, topic
+clustering) and end-to-end ``_generate_async`` jobs against synthetic
+documents and a deterministic fake LLM served through an httpx transport, so
+no API key or network is needed. Example:
+
+    python bench.py --pages 10 100 1000 --concurrency 1 4 16 --jobs 16 --latency 0.2 --error-rate 0.05
+
+Reports jobs/min, p50/p95 job latency, CPU seconds per job and peak RSS for
+each (pages, concurrency) pair. Each pair runs in its own subprocess, so its
+peak RSS is not inflated by the runs before it. Pass ``--json`` to get
+machine-readable output for comparing runs.
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# The app reads its configuration at import time
+os.environ.setdefault("JOB_STORE", "memory")
+os.environ.setdefault("QUESTION_BANK", "off")
+os.environ.setdefault("JOB_STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="questgen-bench-"), "jobs.db"))
+os.environ["LLM_CACHE_MODE"] = "off"
+
+import openai
+
+import main
+from answers import align_answers, balance_answers
+from dedupe import QuestionIndex
+from extract import extract_text
+from llm import LLMDispatcher
+
+# The fake transport must come from the HTTP library the installed openai client is built on
+httpx = importlib.import_module(openai.DefaultAsyncHttpxClient.__mro__[1].__module__.split(".")[0])
+
+WORDS_PER_PAGE = 450
+
+
+def _pseudo_words(rng: random.Random, count: int) -> List[str]:
+    syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pra", "qua", "stel", "mon", "dri"]
+    return ["".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(count)]
+
+
+def synthetic_document(pages: int, seed: int = 0) -> str:
+    """Text of roughly ``pages`` pages, drifting through topics every ~10 pages."""
+    rng = random.Random(seed)
+    common = _pseudo_words(rng, 300)
+    paragraphs = []
+    for page in range(pages):
+        if page % 10 == 0:
+            topical = _pseudo_words(rng, 80)
+        words_left = WORDS_PER_PAGE
+        while words_left > 0:
+            length = min(words_left, rng.randint(60, 140))
+            words = [rng.choice(topical) if rng.random() < 0.3 else rng.choice(common) for _ in range(length)]
+            sentences = [" ".join(words[i:i + 15]).capitalize() + "." for i in range(0, length, 15)]
+            paragraphs.append(" ".join(sentences))
+            words_left -= length
+    return "\n\n".join(paragraphs)
+
+
+class FakeLLMTransport(httpx.AsyncBaseTransport):
+    """Deterministic stand-in for the chat completions API.
+
+    Question prompts get the requested number of distinct questions, and
+    translation prompts get their input echoed back with a prefix. Replies
+    depend only on the request body, the ``seed`` and how many times that body
+    was seen before, never on timing. ``latency`` (seconds, +/- ``jitter``
+    fraction) is slept per request; ``error_rate`` of requests answer 429 with
+    a short Retry-After and ``truncate_rate`` of streamed question replies are
+    cut off as if max_tokens ran out.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.5, error_rate: float = 0.0, truncate_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.seed = seed
+        self.requests = Counter()
+        self._seen: Dict[str, int] = Counter()
+
+    def _questions(self, rng: random.Random, n: int) -> str:
+        vocabulary = _pseudo_words(rng, 400)
+        questions = []
+        for _ in range(n):
+            options = {letter: " ".join(rng.sample(vocabulary, 3)) for letter in "ABCD"}
+            answer = rng.choice("AABCD")
+            questions.append({
+                "question": "Which " + " ".join(rng.sample(vocabulary, 9)) + "?",
+                "options": options,
+                "correct_answer": answer,
+                "explanation": f"The text states that {options[answer]} applies here.",
+                "topic": " ".join(rng.sample(vocabulary, 2)),
+            })
+        return json.dumps(questions, ensure_ascii=False)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        raw = await request.aread()
+        body = json.loads(raw)
+        digest = hashlib.sha256(raw).hexdigest()
+        occurrence = self._seen[digest]
+        self._seen[digest] += 1
+        rng = random.Random(f"{self.seed}:{digest}:{occurrence}")
+
+        await asyncio.sleep(max(0.0, self.latency * (1 + self.jitter * (2 * rng.random() - 1))))
+        if rng.random() < self.error_rate:
+            self.requests["429"] += 1
+            return httpx.Response(429, headers={"retry-after": "0.05"}, json={"error": {"message": "Rate limit reached", "type": "requests"}})
+
+        prompt = body["messages"][-1]["content"]
+        finish_reason = "stop"
+        if "create exactly" in prompt:
+            self.requests["questions"] += 1
+            n = int(prompt.split("create exactly", 1)[1].split()[0])
+            content = self._questions(rng, n)
+            if body.get("stream") and rng.random() < self.truncate_rate:
+                content = content[: int(len(content) * rng.uniform(0.3, 0.9))]
+                finish_reason = "length"
+        elif body.get("response_format", {}).get("type") == "json_object":
+            self.requests["translate_batch"] += 1
+            items = json.loads(prompt[prompt.index("{"):])
+            content = json.dumps({key: f"[tr] {value}" for key, value in items.items()}, ensure_ascii=False)
+        else:
+            self.requests["translate"] += 1
+            content = "[tr] " + prompt.rsplit("\n", 1)[-1]
+
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+        }
+        if not body.get("stream"):
+            return httpx.Response(200, json={
+                "id": f"bench-{digest[:12]}", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        def event(choices: List[Dict[str, Any]], **extra: Any) -> bytes:
+            chunk = {"id": f"bench-{digest[:12]}", "object": "chat.completion.chunk", "created": 0, "model": body["model"], "choices": choices, **extra}
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        events = [event([{"index": 0, "delta": {"content": content[i:i + 64]}, "finish_reason": None}]) for i in range(0, len(content), 64)]
+        events.append(event([{"index": 0, "delta": {}, "finish_reason": finish_reason}]))
+        events.append(event([], usage=usage))
+        events.append(b"data: [DONE]\n\n")
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=b"".join(events))
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _peak_rss_mb() -> float:
+    # A lifetime high-water mark, so main_cli gives every configuration a fresh process
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _timeit(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_hot_paths(text: str, n_questions: int = 5000, seed: int = 0) -> Dict[str, float]:
+    """Best-of-three seconds for the CPU-bound stages, without any LLM calls."""
+    results = {"split": _timeit(main._split_text, text)}
+    chunks = main._split_text(text)
+    if main.TopicIndex is not None and len(chunks) > 1:
+        results["topics"] = _timeit(main.TopicIndex, chunks, repeat=1)
+
+    transport = FakeLLMTransport(seed=seed)
+    questions = json.loads(transport._questions(random.Random(seed), n_questions))
+
+    def dedupe():
+        index = QuestionIndex(main.DEDUPE_THRESHOLD)
+        for q in questions:
+            index.add_if_unique(q["question"])
+
+    def align():
+        align_answers([dict(q) for q in questions])
+
+    def balance():
+        balance_answers([dict(q, options=dict(q["options"])) for q in questions])
+
+    results["dedupe"] = _timeit(dedupe)
+    results["align"] = _timeit(align)
+    results["balance"] = _timeit(balance)
+    return results
+
+
+async def _run_job(text: str, n_questions: int, explanation_language: str) -> Optional[float]:
+    job_id = f"bench-{uuid.uuid4().hex[:12]}"
+    main.JOBS.create(job_id, {"status": "in_progress", "progress": 0, "step": 1, "topics": [], "start_time": time.time(), "done": False})
+    started = time.perf_counter()
+    try:
+        await main._generate_async(job_id, text, "English", explanation_language, n_questions, "excel")
+    except Exception:
+        return None
+    finally:
+        main.JOBS.delete(job_id)
+        main._checkpoint(job_id).path.unlink(missing_ok=True)
+    return time.perf_counter() - started
+
+
+async def bench_jobs(text: str, jobs: int, concurrency: int, n_questions: int, explanation_language: str) -> Dict[str, float]:
+    """Run ``jobs`` end-to-end generation jobs, at most ``concurrency`` at a time."""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def run_one() -> Optional[float]:
+        async with gate:
+            return await _run_job(text, n_questions, explanation_language)
+
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        latencies = await asyncio.gather(*(run_one() for _ in range(jobs)))
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    done = [latency for latency in latencies if latency is not None]
+    return {
+        "jobs": jobs,
+        "failed": jobs - len(done),
+        "jobs_per_min": 60 * len(done) / wall if wall else 0.0,
+        "p50_s": statistics.median(done) if done else 0.0,
+        "p95_s": _percentile(done, 95),
+        "cpu_s_per_job": cpu / jobs,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000], help="synthetic document sizes")
+    parser.add_argument("--document", type=Path, help="benchmark a real PDF/DOCX instead of synthetic text (adds an extract timing)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="concurrent jobs")
+    parser.add_argument("--jobs", type=int, default=16, help="jobs per (pages, concurrency) run")
+    parser.add_argument("--questions", type=int, default=50, help="questions per job")
+    parser.add_argument("--explanation-language", default="French", help="use English to skip translation")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean fake LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency jitter as a fraction of the mean")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of question replies cut off")
+    parser.add_argument("--llm-concurrency", type=int, default=int(os.environ.get("LLM_MAX_CONCURRENCY", "8")))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parser.parse_args(argv)
+
+    sizes = [None] if args.document is not None else args.pages
+    if len(sizes) * len(args.concurrency) > 1:
+        _run_isolated(args, argv, sizes)
+        return
+
+    transport = FakeLLMTransport(args.latency, args.jitter, args.error_rate, args.truncate_rate, args.seed)
+    main._llm = LLMDispatcher(
+        api_key="bench",
+        base_url="http://fake-llm.invalid/v1",
+        max_concurrency=args.llm_concurrency,
+        tokens_per_minute=10 ** 9,
+        transport=transport,
+    )
+    main._llm.observers.append(main._record_llm_call)
+    main.OUTPUT_DIR = Path(tempfile.mkdtemp(prefix="questgen-bench-out-"))
+
+    documents = []
+    if args.document is not None:
+        started = time.perf_counter()
+        documents.append((args.document.name, extract_text(args.document, main.PDF_SKIP_PAGES), time.perf_counter() - started))
+    else:
+        documents = [(f"{pages}p", synthetic_document(pages, args.seed), None) for pages in args.pages]
+
+    # One event loop for every run: the dispatcher's client and locks must not cross loops
+    report = asyncio.run(_run(args, documents))
+    if args.json:
+        print(json.dumps({"args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+                          "fake_llm_requests": dict(transport.requests), "results": report}, indent=2))
+
+
+def _run_isolated(args: argparse.Namespace, argv: List[str], sizes: List[Optional[int]]) -> None:
+    """Run every (pages, concurrency) pair as its own ``bench.py --json`` subprocess and merge the reports."""
+    requests: Counter = Counter()
+    report = []
+    for pages in sizes:
+        for concurrency in args.concurrency:
+            # argparse keeps the last occurrence, so these override the parent's lists
+            overrides = ["--concurrency", str(concurrency), "--json"] + ([] if pages is None else ["--pages", str(pages)])
+            child = subprocess.run([sys.executable, str(Path(__file__).resolve()), *argv, *overrides],
+                                   stdout=subprocess.PIPE, text=True, check=True)
+            output = json.loads(child.stdout)
+            requests.update(output["fake_llm_requests"])
+            row = output["results"][0]
+            report.append(row)
+            if not args.json:
+                _print_row(row)
+        if not args.json:
+            _print_hot_paths(row["document"], row["hot_paths"])
+    if args.json:
+        print(json.dumps({"args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+                          "fake_llm_requests": dict(requests), "results": report}, indent=2))
+
+
+def _print_row(row: Dict[str, Any]) -> None:
+    print(
+        f"{row['document']:>8} c={row['concurrency']:<3} {row['jobs_per_min']:8.1f} jobs/min  "
+        f"p50 {row['p50_s']:6.2f}s  p95 {row['p95_s']:6.2f}s  "
+        f"cpu {row['cpu_s_per_job']:6.3f}s/job  rss {row['peak_rss_mb']:7.1f}MB  failed {row['failed']}"
+    )
+
+
+def _print_hot_paths(name: str, hot: Dict[str, float]) -> None:
+    print(f"{name:>8} hot paths: " + "  ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in hot.items()))
+
+
+async def _run(args: argparse.Namespace, documents: List[tuple]) -> List[Dict[str, Any]]:
+    report = []
+    for name, text, extract_seconds in documents:
+        hot = bench_hot_paths(text, seed=args.seed)
+        if extract_seconds is not None:
+            hot["extract"] = extract_seconds
+        for concurrency in args.concurrency:
+            row = await bench_jobs(text, args.jobs, concurrency, args.questions, args.explanation_language)
+            row.update(document=name, chars=len(text), concurrency=concurrency, hot_paths=hot)
+            report.append(row)
+            if not args.json:
+                _print_row(row)
+        if not args.json:
+            _print_hot_paths(name, hot)
+    return report
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class JobCheckpoint:
+    """Append-only JSON-lines record of a job's questions, durable across crashes.
+
+    The first line holds the job's parameters. Each accepted batch is appended
+    as soon as it passes dedupe, and again once it has been aligned and
+    translated, so ``load`` can tell finished questions from ones that still
+    need finalizing. Every append is fsynced, and a torn last line (from a
+    crash mid-write) is ignored when loading.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self, params: Dict[str, Any]) -> None:
+        """Begin a new checkpoint for a job, replacing any previous one."""
+        self.rewrite(params, [], [])
+
+    def accepted(self, questions: List[Dict[str, Any]]) -> None:
+        self._append({"accepted": questions})
+
+    def finalized(self, questions: List[Dict[str, Any]]) -> None:
+        self._append({"final": questions})
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Return ``(params, finalized, pending)``; questions are keyed and ordered by id."""
+        params, accepted, final = None, {}, {}
+        if not self.path.exists():
+            return params, [], []
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if "job" in record:
+                    params = record["job"]
+                for q in record.get("accepted", ()):
+                    accepted[q["id"]] = q
+                for q in record.get("final", ()):
+                    final[q["id"]] = q
+        pending = [q for qid, q in sorted(accepted.items()) if qid not in final]
+        return params, [q for _, q in sorted(final.items())], pending
+
+    def rewrite(self, params: Optional[Dict[str, Any]], finalized: List[Dict[str, Any]], pending: List[Dict[str, Any]]) -> None:
+        """Atomically replace the checkpoint with a compacted copy, e.g. after renumbering ids."""
+        tmp_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            if params is not None:
+                f.write(json.dumps({"job": params}, ensure_ascii=False) + "\n")
+            if pending:
+                f.write(json.dumps({"accepted": pending}, ensure_ascii=False) + "\n")
+            if finalized:
+                f.write(json.dumps({"accepted": finalized}, ensure_ascii=False) + "\n")
+                f.write(json.dumps({"final": finalized}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,113 @@
+import re
+from typing import Callable, Iterator, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+TokenCounter = Callable[[str], int]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+")
+
+# Bump when iter_chunks would split the same text differently, so cached chunk lists are rebuilt
+CHUNKER_VERSION = 2
+
+
+def approx_token_count(text: str) -> int:
+    """Rough token count (~4 characters per token) used when tiktoken is unavailable."""
+    return (len(text) + 3) // 4
+
+
+def token_counter(model: str) -> TokenCounter:
+    """Return a token counter for ``model``, using tiktoken when it is installed."""
+    if tiktoken is None:
+        return approx_token_count
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def _split_oversized(unit: str, max_tokens: int, count_tokens: TokenCounter) -> Iterator[str]:
+    """Break a paragraph that exceeds the budget into sentences, and sentences into word runs."""
+    for sentence in _SENTENCE_END.split(unit):
+        if count_tokens(sentence) <= max_tokens:
+            yield sentence
+            continue
+        words: List[str] = []
+        for word in sentence.split():
+            if words and count_tokens(" ".join(words + [word])) > max_tokens:
+                yield " ".join(words)
+                words = []
+            words.append(word)
+        if words:
+            yield " ".join(words)
+
+
+def _trailing_sentences(unit: str, budget: int, count_tokens: TokenCounter) -> Optional[str]:
+    """The longest run of whole sentences ending ``unit`` that fits in ``budget`` tokens, if any."""
+    kept: List[str] = []
+    for sentence in reversed(_SENTENCE_END.split(unit)):
+        if count_tokens(" ".join([sentence] + kept)) > budget:
+            break
+        kept.insert(0, sentence)
+    return " ".join(kept) if kept else None
+
+
+def iter_chunks(
+    text: str,
+    max_tokens: int,
+    overlap_tokens: int = 0,
+    count_tokens: Optional[TokenCounter] = None,
+) -> Iterator[str]:
+    """Yield chunks of ``text`` that each fit in ``max_tokens``.
+
+    Paragraphs are packed together until the budget is reached. A paragraph
+    that is too large on its own is split at sentence boundaries (and, as a
+    last resort, between words). With ``overlap_tokens`` each chunk starts with
+    the trailing units of the previous one, up to that many tokens; when a
+    unit is too long to carry whole, its trailing sentences are carried.
+    """
+    count_tokens = count_tokens or approx_token_count
+    separator_tokens = count_tokens("\n\n")
+    current: List[str] = []
+    sizes: List[int] = []
+    current_tokens = 0
+
+    def units() -> Iterator[str]:
+        for para in text.split("\n\n"):
+            if count_tokens(para) <= max_tokens:
+                yield para
+            else:
+                yield from _split_oversized(para, max_tokens, count_tokens)
+
+    for unit in units():
+        if not unit.strip():
+            continue
+        unit_tokens = count_tokens(unit)
+        if current and current_tokens + separator_tokens + unit_tokens > max_tokens:
+            yield "\n\n".join(current)
+            # Carry the tail of the previous chunk forward as overlap
+            kept, kept_tokens = [], 0
+            for prev, prev_tokens in zip(reversed(current), reversed(sizes)):
+                if kept_tokens + prev_tokens > overlap_tokens or kept_tokens + prev_tokens + unit_tokens > max_tokens:
+                    budget = min(overlap_tokens, max_tokens - unit_tokens - separator_tokens) - kept_tokens
+                    tail = _trailing_sentences(prev, budget, count_tokens) if budget > 0 else None
+                    if tail is not None:
+                        kept.insert(0, (tail, count_tokens(tail)))
+                    break
+                kept.insert(0, (prev, prev_tokens))
+                kept_tokens += prev_tokens + separator_tokens
+            current = [u for u, _ in kept]
+            sizes = [t for _, t in kept]
+            current_tokens = sum(sizes) + separator_tokens * max(len(sizes) - 1, 0)
+        if current:
+            current_tokens += separator_tokens
+        current.append(unit)
+        sizes.append(unit_tokens)
+        current_tokens += unit_tokens
+
+    if current:
+        yield "\n\n".join(current)
@@ -0,0 +1,73 @@
+from collections import defaultdict
+from math import floor
+from typing import Dict, FrozenSet, List, Set
+
+
+def _tokens(text: str) -> FrozenSet[str]:
+    return frozenset(text.lower().split())
+
+
+def _token_order(token: str):
+    # Any fixed total order works for prefix filtering; longer words tend to be rarer,
+    # so putting them first keeps the posting lists short.
+    return (-len(token), token)
+
+
+class QuestionIndex:
+    """Near-duplicate index over question texts.
+
+    Two questions are duplicates when their word overlap divided by the larger
+    word set exceeds ``threshold``. Token sets are computed once per question,
+    and an inverted index over each set's prefix (prefix filtering) limits the
+    exact comparison to questions that can possibly clear the threshold, so
+    lookups stay cheap on banks of thousands of questions.
+    """
+
+    def __init__(self, threshold: float = 0.85):
+        self.threshold = threshold
+        self._sets: List[FrozenSet[str]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+    def _prefix(self, tokens: FrozenSet[str]) -> List[str]:
+        # A pair can only exceed the threshold if it shares at least floor(t*|X|)+1 tokens,
+        # so it must share a token among the first |X| - floor(t*|X|) tokens of each set.
+        size = len(tokens) - floor(self.threshold * len(tokens))
+        return sorted(tokens, key=_token_order)[:max(size, 0)]
+
+    def similarity(self, a: FrozenSet[str], b: FrozenSet[str]) -> float:
+        longest = max(len(a), len(b))
+        return len(a & b) / longest if longest else 0.0
+
+    def _is_duplicate(self, tokens: FrozenSet[str]) -> bool:
+        seen: Set[int] = set()
+        for token in self._prefix(tokens):
+            for idx in self._postings.get(token, ()):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                if self.similarity(tokens, self._sets[idx]) > self.threshold:
+                    return True
+        return False
+
+    def is_duplicate(self, text: str) -> bool:
+        return self._is_duplicate(_tokens(text))
+
+    def _insert(self, tokens: FrozenSet[str]) -> None:
+        idx = len(self._sets)
+        self._sets.append(tokens)
+        for token in self._prefix(tokens):
+            self._postings[token].append(idx)
+
+    def add(self, text: str) -> None:
+        self._insert(_tokens(text))
+
+    def add_if_unique(self, text: str) -> bool:
+        """Add ``text`` unless it near-duplicates an indexed question. Returns True if added."""
+        tokens = _tokens(text)
+        if self._is_duplicate(tokens):
+            return False
+        self._insert(tokens)
+        return True
@@ -0,0 +1,39 @@
+import time
+from pathlib import Path
+from typing import List
+
+import docx2txt
+import pdfplumber
+
+# Entry points for the extraction process pool. Pool workers are spawned, and they import this
+# module rather than main, so each one loads only the PDF/DOCX libraries and not the whole app.
+
+
+def timed(fn, *args):
+    """Run ``fn`` in a pool worker and also return the wall-clock time it started, to measure queueing."""
+    return time.time(), fn(*args)
+
+
+def count_pdf_pages(file_path: Path) -> int:
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pdf_pages(file_path: Path, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF."""
+    with pdfplumber.open(file_path) as pdf:
+        # Some pages may not have any extracted text (returns None), so replace with empty string
+        return [(page.extract_text() or "") for page in pdf.pages[start:end]]
+
+
+def extract_text(file_path: Path, skip_pages: int = 0) -> str:
+    """Extract raw text from a PDF or DOCX file, leaving out the first ``skip_pages`` pages of a longer PDF."""
+    if file_path.suffix.lower() == '.pdf':
+        with pdfplumber.open(file_path) as pdf:
+            pages_to_read = pdf.pages[skip_pages:] if len(pdf.pages) > skip_pages else pdf.pages
+            text = "\n\n".join((page.extract_text() or "") for page in pages_to_read)
+    elif file_path.suffix.lower() == '.docx':
+        text = docx2txt.process(file_path)
+    else:
+        raise ValueError(f"Unsupported file type: {file_path.suffix}")
+    return text.strip()
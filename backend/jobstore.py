@@ -0,0 +1,445 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+FINISHED_STATUSES = ("completed", "error")
+
+
+class JobStore:
+    """Storage for job records, their event streams and their generated questions.
+
+    Job fields are a flat JSON-serialisable dict. Events (log lines, progress
+    updates, question batches) and questions live beside the record so they
+    can be appended and paged without rewriting it. Event ids increase
+    monotonically and double as log cursors. Finished jobs are dropped
+    ``ttl_seconds`` after they finish.
+
+    Methods block (a SQLite write may wait for another process to release the
+    database lock), so async code calls them through ``asyncio.to_thread``.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._last_eviction = 0.0
+        # Called with (job_id, event_id) after each event is stored in this process
+        self.listeners: List[Callable[[str, int], None]] = []
+        # Called with the job id after an expired job is evicted, to drop what it keeps outside the store
+        self.evict_listeners: List[Callable[[str], None]] = []
+
+    def _notify(self, job_id: str, event_id: int) -> None:
+        for listener in self.listeners:
+            listener(job_id, event_id)
+
+    def create(self, job_id: str, fields: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def exists(self, job_id: str) -> bool:
+        raise NotImplementedError
+
+    def get(self, job_id: str, include_logs: bool = True, include_questions: bool = True) -> Optional[Dict[str, Any]]:
+        """Return the job's fields, plus ``logs`` and ``questions`` lists unless excluded."""
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """Atomically set the given fields."""
+        raise NotImplementedError
+
+    def increment(self, job_id: str, field: str, amount: int = 1) -> int:
+        """Atomically add ``amount`` to a numeric field and return the new value."""
+        return self.increment_many(job_id, {field: amount})[field]
+
+    def increment_many(self, job_id: str, amounts: Dict[str, float]) -> Dict[str, float]:
+        """Atomically add to several numeric fields at once and return their new values."""
+        raise NotImplementedError
+
+    def append_event(self, job_id: str, kind: str, data: Any) -> int:
+        """Store an event and return its id."""
+        raise NotImplementedError
+
+    def events(self, job_id: str, after: int = 0, limit: Optional[int] = None) -> List[Tuple[int, str, Any]]:
+        """Return ``(event_id, kind, data)`` triples newer than ``after``, oldest first."""
+        raise NotImplementedError
+
+    def append_log(self, job_id: str, message: str) -> int:
+        return self.append_event(job_id, "log", message)
+
+    def logs(self, job_id: str, after: int = 0, limit: Optional[int] = None) -> List[Tuple[int, str]]:
+        """Return ``(cursor, message)`` pairs newer than ``after``, oldest first."""
+        raise NotImplementedError
+
+    def tail_logs(self, job_id: str, limit: int) -> List[Tuple[int, str]]:
+        """Return the last ``limit`` ``(cursor, message)`` pairs, oldest first."""
+        raise NotImplementedError
+
+    def set_questions(self, job_id: str, questions: List[Dict[str, Any]]) -> None:
+        """Replace the job's questions and bump its ``questions_version`` field."""
+        raise NotImplementedError
+
+    def append_questions(self, job_id: str, questions: List[Dict[str, Any]]) -> None:
+        """Append questions after the existing ones and bump ``questions_version``."""
+        raise NotImplementedError
+
+    def questions(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def question_count(self, job_id: str) -> int:
+        raise NotImplementedError
+
+    def delete(self, job_id: str) -> None:
+        raise NotImplementedError
+
+    def _expired_ids(self, cutoff: float) -> List[str]:
+        raise NotImplementedError
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """Delete jobs that finished more than ``ttl_seconds`` ago. Returns how many were removed."""
+        now = time.time() if now is None else now
+        self._last_eviction = now
+        expired = self._expired_ids(now - self.ttl_seconds)
+        for job_id in expired:
+            self.delete(job_id)
+            for listener in self.evict_listeners:
+                listener(job_id)
+        return len(expired)
+
+    def _maybe_evict(self) -> None:
+        now = time.time()
+        if now - self._last_eviction > min(self.ttl_seconds, 60):
+            self.evict_expired(now)
+
+
+class MemoryJobStore(JobStore):
+    """Single-process store backed by dicts. Lost on restart and not shared between workers."""
+
+    def __init__(self, ttl_seconds: float = 3600):
+        super().__init__(ttl_seconds)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, List[Tuple[str, Any]]] = {}
+        self._questions: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, fields: Dict[str, Any]) -> None:
+        self._maybe_evict()
+        with self._lock:
+            self._jobs[job_id] = dict(fields, updated_at=time.time())
+            self._events[job_id] = []
+            self._questions[job_id] = []
+
+    def exists(self, job_id: str) -> bool:
+        return job_id in self._jobs
+
+    def get(self, job_id: str, include_logs: bool = True, include_questions: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if job_id not in self._jobs:
+                return None
+            job = dict(self._jobs[job_id])
+            if include_logs:
+                job["logs"] = [data for kind, data in self._events[job_id] if kind == "log"]
+            if include_questions:
+                job["questions"] = list(self._questions[job_id])
+            return job
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=time.time())
+            if fields.get("status") in FINISHED_STATUSES:
+                job.setdefault("finished_at", job["updated_at"])
+            elif "status" in fields:
+                # Back in progress (resumed): no longer due for eviction
+                job.pop("finished_at", None)
+
+    def increment_many(self, job_id: str, amounts: Dict[str, float]) -> Dict[str, float]:
+        with self._lock:
+            job = self._jobs[job_id]
+            for field, amount in amounts.items():
+                job[field] = job.get(field, 0) + amount
+            job["updated_at"] = time.time()
+            return {field: job[field] for field in amounts}
+
+    def append_event(self, job_id: str, kind: str, data: Any) -> int:
+        with self._lock:
+            events = self._events[job_id]
+            events.append((kind, data))
+            event_id = len(events)
+        self._notify(job_id, event_id)
+        return event_id
+
+    def events(self, job_id: str, after: int = 0, limit: Optional[int] = None) -> List[Tuple[int, str, Any]]:
+        with self._lock:
+            events = self._events.get(job_id, [])
+            end = len(events) if limit is None else min(len(events), after + limit)
+            return [(seq, *events[seq - 1]) for seq in range(after + 1, end + 1)]
+
+    def logs(self, job_id: str, after: int = 0, limit: Optional[int] = None) -> List[Tuple[int, str]]:
+        with self._lock:
+            events = self._events.get(job_id, [])
+            lines = []
+            for seq in range(after + 1, len(events) + 1):
+                if limit is not None and len(lines) >= limit:
+                    break
+                kind, data = events[seq - 1]
+                if kind == "log":
+                    lines.append((seq, data))
+            return lines
+
+    def tail_logs(self, job_id: str, limit: int) -> List[Tuple[int, str]]:
+        with self._lock:
+            events = self._events.get(job_id, [])
+            lines = []
+            for seq in range(len(events), 0, -1):
+                if len(lines) >= limit:
+                    break
+                kind, data = events[seq - 1]
+                if kind == "log":
+                    lines.append((seq, data))
+            return lines[::-1]
+
+    def set_questions(self, job_id: str, questions: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._questions[job_id] = list(questions)
+            job = self._jobs[job_id]
+            job["questions_version"] = job.get("questions_version", 0) + 1
+
+    def append_questions(self, job_id: str, questions: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._questions[job_id].extend(questions)
+            job = self._jobs[job_id]
+            job["questions_version"] = job.get("questions_version", 0) + 1
+
+    def questions(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            questions = self._questions.get(job_id, [])
+            return questions[offset:] if limit is None else questions[offset:offset + limit]
+
+    def question_count(self, job_id: str) -> int:
+        return len(self._questions.get(job_id, []))
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._events.pop(job_id, None)
+            self._questions.pop(job_id, None)
+
+    def _expired_ids(self, cutoff: float) -> List[str]:
+        with self._lock:
+            return [job_id for job_id, job in self._jobs.items() if job.get("finished_at", cutoff + 1) < cutoff]
+
+
+class SQLiteJobStore(JobStore):
+    """Store backed by a SQLite database in WAL mode.
+
+    Every uvicorn worker opens the same file, so a job created by one worker
+    can be polled through any other. Field updates run inside ``BEGIN
+    IMMEDIATE`` transactions, which makes read-modify-write updates atomic
+    across processes.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float = 3600):
+        super().__init__(ttl_seconds)
+        self.path = Path(path)
+        self._db = SQLiteDatabase(self.path)
+        with self._db.connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+                CREATE TABLE IF NOT EXISTS job_events (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq);
+                CREATE TABLE IF NOT EXISTS job_questions (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (job_id, idx)
+                );
+                """
+            )
+
+    def create(self, job_id: str, fields: Dict[str, Any]) -> None:
+        self._maybe_evict()
+        with self._db.write() as conn:
+            conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_questions WHERE job_id = ?", (job_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data, updated_at, finished_at) VALUES (?, ?, ?, NULL)",
+                (job_id, json.dumps(fields), time.time()),
+            )
+
+    def exists(self, job_id: str) -> bool:
+        return self._db.connect().execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is not None
+
+    def get(self, job_id: str, include_logs: bool = True, include_questions: bool = True) -> Optional[Dict[str, Any]]:
+        conn = self._db.connect()
+        row = conn.execute("SELECT data, updated_at, finished_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = json.loads(row[0])
+        job["updated_at"] = row[1]
+        if row[2] is not None:
+            job["finished_at"] = row[2]
+        if include_logs:
+            job["logs"] = [message for _, message in self.logs(job_id)]
+        if include_questions:
+            job["questions"] = self.questions(job_id)
+        return job
+
+    def _load_for_update(self, conn: sqlite3.Connection, job_id: str) -> Dict[str, Any]:
+        row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        return json.loads(row[0])
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        with self._db.write() as conn:
+            job = self._load_for_update(conn, job_id)
+            job.update(fields)
+            now = time.time()
+            if fields.get("status") in FINISHED_STATUSES:
+                finished_sql, finished = "COALESCE(finished_at, ?)", now
+            elif "status" in fields:
+                # Back in progress (resumed): no longer due for eviction
+                finished_sql, finished = "?", None
+            else:
+                finished_sql, finished = "COALESCE(finished_at, ?)", None
+            conn.execute(
+                f"UPDATE jobs SET data = ?, updated_at = ?, finished_at = {finished_sql} WHERE id = ?",
+                (json.dumps(job), now, finished, job_id),
+            )
+
+    def increment_many(self, job_id: str, amounts: Dict[str, float]) -> Dict[str, float]:
+        with self._db.write() as conn:
+            job = self._load_for_update(conn, job_id)
+            for field, amount in amounts.items():
+                job[field] = job.get(field, 0) + amount
+            conn.execute("UPDATE jobs SET data = ?, updated_at = ? WHERE id = ?", (json.dumps(job), time.time(), job_id))
+            return {field: job[field] for field in amounts}
+
+    def append_event(self, job_id: str, kind: str, data: Any) -> int:
+        with self._db.write() as conn:
+            event_id = conn.execute(
+                "INSERT INTO job_events (job_id, kind, data) VALUES (?, ?, ?)", (job_id, kind, json.dumps(data))
+            ).lastrowid
+        self._notify(job_id, event_id)
+        return event_id
+
+    def events(self, job_id: str, after: int = 0, limit: Optional[int] = None) -> List[Tuple[int, str, Any]]:
+        rows = self._db.connect().execute(
+            "SELECT seq, kind, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (job_id, after, -1 if limit is None else limit),
+        ).fetchall()
+        return [(seq, kind, json.loads(data)) for seq, kind, data in rows]
+
+    def logs(self, job_id: str, after: int = 0, limit: Optional[int] = None) -> List[Tuple[int, str]]:
+        rows = self._db.connect().execute(
+            "SELECT seq, data FROM job_events WHERE job_id = ? AND kind = 'log' AND seq > ? ORDER BY seq LIMIT ?",
+            (job_id, after, -1 if limit is None else limit),
+        ).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    def tail_logs(self, job_id: str, limit: int) -> List[Tuple[int, str]]:
+        rows = self._db.connect().execute(
+            "SELECT seq, data FROM job_events WHERE job_id = ? AND kind = 'log' ORDER BY seq DESC LIMIT ?",
+            (job_id, limit),
+        ).fetchall()
+        return [(seq, json.loads(data)) for seq, data in reversed(rows)]
+
+    def set_questions(self, job_id: str, questions: List[Dict[str, Any]]) -> None:
+        with self._db.write() as conn:
+            job = self._load_for_update(conn, job_id)
+            job["questions_version"] = job.get("questions_version", 0) + 1
+            conn.execute("UPDATE jobs SET data = ?, updated_at = ? WHERE id = ?", (json.dumps(job), time.time(), job_id))
+            conn.execute("DELETE FROM job_questions WHERE job_id = ?", (job_id,))
+            conn.executemany(
+                "INSERT INTO job_questions (job_id, idx, data) VALUES (?, ?, ?)",
+                ((job_id, idx, json.dumps(q)) for idx, q in enumerate(questions)),
+            )
+
+    def append_questions(self, job_id: str, questions: List[Dict[str, Any]]) -> None:
+        with self._db.write() as conn:
+            job = self._load_for_update(conn, job_id)
+            job["questions_version"] = job.get("questions_version", 0) + 1
+            conn.execute("UPDATE jobs SET data = ?, updated_at = ? WHERE id = ?", (json.dumps(job), time.time(), job_id))
+            start = conn.execute("SELECT COUNT(*) FROM job_questions WHERE job_id = ?", (job_id,)).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO job_questions (job_id, idx, data) VALUES (?, ?, ?)",
+                ((job_id, start + offset, json.dumps(q)) for offset, q in enumerate(questions)),
+            )
+
+    def questions(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = self._db.connect().execute(
+            "SELECT data FROM job_questions WHERE job_id = ? ORDER BY idx LIMIT ? OFFSET ?",
+            (job_id, -1 if limit is None else limit, offset),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def question_count(self, job_id: str) -> int:
+        return self._db.connect().execute("SELECT COUNT(*) FROM job_questions WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+    def delete(self, job_id: str) -> None:
+        with self._db.write() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_questions WHERE job_id = ?", (job_id,))
+
+    def _expired_ids(self, cutoff: float) -> List[str]:
+        rows = self._db.connect().execute("SELECT id FROM jobs WHERE finished_at < ?", (cutoff,)).fetchall()
+        return [row[0] for row in rows]
+
+
+class SQLiteDatabase:
+    """Per-thread connections to one SQLite file in WAL mode, shared by the SQLite-backed stores.
+
+    ``write()`` runs a ``BEGIN IMMEDIATE`` transaction, so read-modify-write
+    updates stay atomic when several processes open the same file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def write(self) -> "_ImmediateTransaction":
+        return _ImmediateTransaction(self.connect())
+
+
+class _ImmediateTransaction:
+    """Context manager running a write transaction that takes the database lock up front."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def open_job_store(backend: str, path: Path, ttl_seconds: float) -> JobStore:
+    if backend == "memory":
+        return MemoryJobStore(ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteJobStore(path, ttl_seconds)
+    raise ValueError(f"Unknown job store backend: {backend}")
@@ -0,0 +1,113 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_QUESTIONS_ARRAY = re.compile(r'"questions"\s*:\s*\[$')
+
+
+class JSONObjectStream:
+    """Incrementally pull complete JSON objects out of streamed LLM output.
+
+    Text is fed in arbitrary pieces. Anything outside an object (the enclosing
+    ``[``, commas, markdown fences, chatty prose) is skipped, and every
+    balanced top-level ``{...}`` is parsed as soon as its closing brace
+    arrives. Replies wrapped as ``{"questions": [...]}`` yield each element of
+    that array as it closes, and the wrapper itself is not returned again. If
+    the reply is cut off, the objects already completed are still returned.
+    Objects that fail to parse are counted in ``errors``.
+    """
+
+    def __init__(self):
+        self._current: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_questions = False
+        self._item_start: Optional[int] = None
+        self._item_chars = 0
+        self._unwrapped = False
+        self.total_chars = 0
+        self.parsed_chars = 0
+        self.errors = 0
+
+    @property
+    def pending(self) -> bool:
+        """True while an object has been opened but not yet closed."""
+        return self._depth > 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        objects = []
+        for ch in text:
+            self.total_chars += 1
+            if self._depth == 0:
+                if ch == "{":
+                    self._current = [ch]
+                    self._depth = 1
+                continue
+
+            self._current.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "[" and self._depth == 1:
+                self._in_questions = bool(_QUESTIONS_ARRAY.search("".join(self._current)))
+            elif ch == "]" and self._depth == 1:
+                self._in_questions = False
+            elif ch == "{":
+                if self._depth == 1 and self._in_questions:
+                    self._item_start = len(self._current) - 1
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 1 and self._item_start is not None:
+                    obj = self._parse("".join(self._current[self._item_start:]))
+                    self._item_start = None
+                    self._unwrapped = True
+                    if obj is not None:
+                        objects.append(obj)
+                elif self._depth == 0:
+                    raw = "".join(self._current)
+                    item_chars, self._item_chars = self._item_chars, 0
+                    unwrapped, self._unwrapped = self._unwrapped, False
+                    self._current = []
+                    self._in_questions = False
+                    if unwrapped:
+                        # The elements were already returned; only account for the wrapper's own text
+                        try:
+                            json.loads(raw)
+                        except ValueError:
+                            self.errors += 1
+                            continue
+                        self.parsed_chars += len(raw) - item_chars
+                        continue
+                    obj = self._parse(raw)
+                    if obj is not None:
+                        objects.append(obj)
+        return objects
+
+    def _parse(self, raw: str) -> Optional[Dict[str, Any]]:
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            self.errors += 1
+            return None
+        self.parsed_chars += len(raw)
+        if self._depth:
+            self._item_chars += len(raw)
+        return obj
+
+
+def question_objects(obj: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Unwrap replies shaped like {"questions": [...]} into the question objects themselves."""
+    if "question" in obj:
+        return [obj]
+    for value in obj.values():
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            return value
+    return []
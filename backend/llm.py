@@ -0,0 +1,371 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Union
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletion
+
+from cache import DiskCache
+
+CACHE_MODES = ("off", "readwrite", "replay")
+
+
+class LLMCacheMiss(Exception):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+class _FairSemaphore:
+    """Concurrency limiter that hands free slots to waiting jobs round-robin.
+
+    A job that queues 40 requests can't starve a job that queues one: when a
+    slot frees up it goes to the next job in turn, not the next request.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._active = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    async def acquire(self, key: str) -> None:
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed to us just before cancellation; pass it on
+                self.release()
+            else:
+                queue = self._waiters.get(key)
+                if queue is not None and fut in queue:
+                    queue.remove(fut)
+                    if not queue:
+                        del self._waiters[key]
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            key, queue = next(iter(self._waiters.items()))
+            fut = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            if not fut.done():
+                fut.set_result(None)  # the slot moves to the waiter, _active is unchanged
+                return
+        self._active -= 1
+
+
+class _TokenBucket:
+    """Tokens-per-minute budget shared by every request in the process."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: int) -> None:
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+
+    def refund(self, tokens: int) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMDispatcher:
+    """Process-wide async gateway to the chat completions API.
+
+    All LLM calls go through one pooled AsyncOpenAI client with a global
+    concurrency cap, a tokens-per-minute budget, jittered exponential backoff
+    on 429/5xx, and round-robin scheduling across jobs. Point ``base_url`` at a
+    local OpenAI-compatible server, or pass an httpx ``transport``, to run
+    against a fake backend.
+
+    With a ``cache``, responses are stored under a fingerprint of model, messages
+    and parameters. ``cache_mode="readwrite"`` serves hits and records misses;
+    ``"replay"`` never calls the API and raises LLMCacheMiss instead, so a
+    recorded pipeline can be re-run offline and deterministically.
+
+    Functions in ``observers`` (plain or async) are called with ``(job_id, stats)``
+    after every completed request; ``stats`` holds the model, whether it was a cache hit,
+    seconds spent waiting for a slot and token budget, request latency, the
+    number of retries and the token usage.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 8,
+        tokens_per_minute: int = 160_000,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        cache: Optional[DiskCache] = None,
+        cache_mode: str = "off",
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode: {cache_mode}")
+        self.cache = cache if cache_mode != "off" else None
+        self.cache_mode = cache_mode
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._slots = _FairSemaphore(max_concurrency)
+        self._budget = _TokenBucket(tokens_per_minute)
+        self.observers: List[Callable[[str, Dict[str, Any]], Optional[Awaitable[None]]]] = []
+        self._client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,  # retries are scheduled here so they respect the shared budget
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_concurrency,
+                    max_keepalive_connections=max_concurrency,
+                ),
+                transport=transport,
+            ),
+        )
+
+    @staticmethod
+    def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+        # ~4 characters per token is close enough for budgeting
+        return sum(len(m.get("content", "")) for m in messages) // 4 + max_tokens
+
+    @staticmethod
+    def fingerprint(model: str, messages: List[Dict[str, str]], max_tokens: Optional[int], params: Dict[str, Any], variant: Union[int, str] = 0) -> str:
+        # timeout only affects transport, so it is left out of the key; so is max_tokens when passed as None
+        key = {k: v for k, v in params.items() if k != "timeout"}
+        key.update(model=model, messages=messages, max_tokens=max_tokens, variant=variant)
+        return hashlib.sha256(json.dumps(key, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    async def _report(self, job_id: str, model: str, usage: Any, cached: bool = False, queue_seconds: float = 0.0, latency_seconds: float = 0.0, retries: int = 0) -> None:
+        stats = {
+            "model": model,
+            "cached": cached,
+            "queue_seconds": queue_seconds,
+            "latency_seconds": latency_seconds,
+            "retries": retries,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+        for observer in self.observers:
+            result = observer(job_id, stats)
+            if inspect.isawaitable(result):
+                await result
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        delay = _retry_after(exc)
+        if delay is None:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.5)
+
+    async def chat(self, job_id: str, messages: List[Dict[str, str]], *, model: str, max_tokens: int, cache_variant: Union[int, str] = 0, cache_by_max_tokens: bool = True, **params: Any):
+        """Run one chat completion for ``job_id`` and return the raw response.
+
+        ``cache_variant`` separates deliberate repeats of the same prompt (e.g. asking the
+        same chunk for more questions) so they are not answered from the cache. Pass
+        ``cache_by_max_tokens=False`` when max_tokens is tuned from call to call but the
+        prompt alone determines what is asked for, so repeats still hit the cache.
+        Only replies that finished with ``stop`` are cached.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.fingerprint(model, messages, max_tokens if cache_by_max_tokens else None, params, cache_variant)
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                response = ChatCompletion.model_validate(cached)
+                await self._report(job_id, model, response.usage, cached=True)
+                return response
+            if self.cache_mode == "replay":
+                raise LLMCacheMiss(f"No recorded response for request {key[:12]}")
+
+        response = await self._dispatch(job_id, messages, model=model, max_tokens=max_tokens, **params)
+        # Only whole replies are kept: a truncated one would be replayed even after max_tokens is raised
+        if key is not None and response.choices and response.choices[0].finish_reason == "stop":
+            await asyncio.to_thread(self.cache.set, key, response.model_dump(mode="json"))
+        return response
+
+    async def _dispatch(self, job_id: str, messages: List[Dict[str, str]], *, model: str, max_tokens: int, **params: Any):
+        estimate = self.estimate_tokens(messages, max_tokens)
+        attempt = 0
+        queued = 0.0
+        while True:
+            waiting = time.monotonic()
+            await self._slots.acquire(job_id)
+            try:
+                await self._budget.acquire(estimate)
+                started = time.monotonic()
+                queued += started - waiting
+                response = await self._client.chat.completions.create(
+                    model=model, messages=messages, max_tokens=max_tokens, **params
+                )
+            except Exception as exc:
+                if attempt >= self.max_retries or not _is_retryable(exc):
+                    raise
+                delay = self._backoff(attempt, exc)
+                attempt += 1
+            else:
+                latency = time.monotonic() - started
+                break
+            finally:
+                self._slots.release()
+            # Back off without holding a slot so other jobs keep moving
+            await asyncio.sleep(delay)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None and usage.total_tokens < estimate:
+            self._budget.refund(estimate - usage.total_tokens)
+        await self._report(job_id, model, usage, queue_seconds=queued, latency_seconds=latency, retries=attempt)
+        return response
+
+    def chat_stream(self, job_id: str, messages: List[Dict[str, str]], *, model: str, max_tokens: int, cache_variant: Union[int, str] = 0, cache_by_max_tokens: bool = True, **params: Any) -> "ChatStream":
+        """Like ``chat`` but streams the reply; iterate the result for content deltas."""
+        return ChatStream(self, job_id, messages, model, max_tokens, cache_variant, params, cache_by_max_tokens)
+
+
+class ChatStream:
+    """One streamed chat completion.
+
+    Iterating yields text deltas as they arrive. Afterwards ``content``,
+    ``finish_reason`` and ``usage`` describe the whole reply. Requests are
+    retried only if they fail before the first delta; a failure mid-stream is
+    raised so the caller can keep whatever it already parsed. Replies that
+    finished with ``stop`` are written to the dispatcher's cache in the same
+    shape as ``chat``.
+    """
+
+    def __init__(self, dispatcher: LLMDispatcher, job_id: str, messages: List[Dict[str, str]], model: str, max_tokens: int, cache_variant: Union[int, str], params: Dict[str, Any], cache_by_max_tokens: bool = True):
+        self._dispatcher = dispatcher
+        self._job_id = job_id
+        self._messages = messages
+        self._model = model
+        self._max_tokens = max_tokens
+        self._cache_variant = cache_variant
+        self._params = params
+        self._cache_by_max_tokens = cache_by_max_tokens
+        self._parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Any] = None
+        self.from_cache = False
+
+    @property
+    def content(self) -> str:
+        # Joined on read rather than per delta, which would be quadratic in the reply length
+        return "".join(self._parts)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        d = self._dispatcher
+        key = None
+        if d.cache is not None:
+            key = d.fingerprint(self._model, self._messages, self._max_tokens if self._cache_by_max_tokens else None, self._params, self._cache_variant)
+            cached = await asyncio.to_thread(d.cache.get, key)
+            if cached is not None:
+                response = ChatCompletion.model_validate(cached)
+                self._parts = [response.choices[0].message.content or ""]
+                self.finish_reason = response.choices[0].finish_reason
+                self.usage = response.usage
+                self.from_cache = True
+                await d._report(self._job_id, self._model, self.usage, cached=True)
+                yield self.content
+                return
+            if d.cache_mode == "replay":
+                raise LLMCacheMiss(f"No recorded response for request {key[:12]}")
+
+        estimate = d.estimate_tokens(self._messages, self._max_tokens)
+        parts = self._parts
+        attempt = 0
+        queued = 0.0
+        while True:
+            waiting = time.monotonic()
+            await d._slots.acquire(self._job_id)
+            try:
+                await d._budget.acquire(estimate)
+                started = time.monotonic()
+                queued += started - waiting
+                stream = await d._client.chat.completions.create(
+                    model=self._model,
+                    messages=self._messages,
+                    max_tokens=self._max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **self._params,
+                )
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        self.usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    if choice.finish_reason:
+                        self.finish_reason = choice.finish_reason
+                    if choice.delta and choice.delta.content:
+                        parts.append(choice.delta.content)
+                        yield choice.delta.content
+                latency = time.monotonic() - started
+                break
+            except Exception as exc:
+                if parts or attempt >= d.max_retries or not _is_retryable(exc):
+                    raise
+                delay = d._backoff(attempt, exc)
+                attempt += 1
+            finally:
+                d._slots.release()
+            await asyncio.sleep(delay)
+
+        if self.usage is not None and self.usage.total_tokens < estimate:
+            d._budget.refund(estimate - self.usage.total_tokens)
+        await d._report(self._job_id, self._model, self.usage, queue_seconds=queued, latency_seconds=latency, retries=attempt)
+        if key is not None and self.finish_reason == "stop":
+            await asyncio.to_thread(d.cache.set, key, {
+                "id": f"stream-{key[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": self._model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.content},
+                    "finish_reason": self.finish_reason,
+                }],
+                "usage": self.usage.model_dump(mode="json") if self.usage is not None else None,
+            })
@@ -1,30 +1,47 @@
-from fastapi import FastAPI, UploadFile, Form, HTTPException, BackgroundTasks
-from starlette.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, Form, HTTPException, BackgroundTasks, Query, Request
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 from pydantic import BaseModel
-import openai
 import os
 import json
 import time
 import threading
-import pandas as pd
 from pathlib import Path
-import pdfplumber
-import docx2txt
-import re
 import sys
 import uuid
+import hashlib
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-import functools
-import random
-from datetime import datetime
+import shutil
+import zipfile
+import zlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import csv
+import copy
+from openpyxl import Workbook
+from cache import DiskCache
+from llm import LLMDispatcher
+from dedupe import QuestionIndex
+from chunking import CHUNKER_VERSION, iter_chunks, token_counter
+from jsonstream import JSONObjectStream, question_objects
+from batching import BatchSizer
+from metrics import Metrics
+from jobstore import FINISHED_STATUSES, JobStore, open_job_store
+from taskqueue import TaskQueue, open_task_queue
+from checkpoint import JobCheckpoint
+from extract import count_pdf_pages, extract_pdf_pages, extract_text, timed
+from answers import align_answers, answer_counts, balance_answers
+from questionbank import QuestionBank, open_question_bank
+from admission import AdmissionController, Saturated, UploadGate, client_key, describe_bytes
+try:
+    from topics import TopicIndex
+except ImportError:  # numpy is optional: without it batches are spread evenly over the chunks
+    TopicIndex = None
 
 # Global variables
-JOBS: Dict[str, Dict] = {}
-MAX_CONTEXT_CHARS = 8000  # simple clipping so we don't exceed token limits
-CHUNK_SIZE_CHARS = 6000  # size per GPT request
 BASE_DIR = Path(__file__).resolve().parent
 UPLOAD_DIR = BASE_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True, parents=True)  # Ensure the uploads directory exists
@@ -32,12 +49,256 @@ TEXT_DIR = BASE_DIR / "text"
 TEXT_DIR.mkdir(exist_ok=True, parents=True)  # Ensure the text directory exists
 OUTPUT_DIR = BASE_DIR / "output"
 OUTPUT_DIR.mkdir(exist_ok=True, parents=True)  # Ensure the output directory exists
+EXPORT_PAGE_SIZE = 500  # questions read from the job store per page while exporting
+EXPORT_COLUMNS = ['ID', 'Question', 'Option A', 'Option B', 'Option C', 'Option D', 'Correct Answer', 'Explanation', 'Topic']
+EXPORT_MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # stream uploads to disk 1 MiB at a time
+DOCUMENT_SUFFIXES = (".pdf", ".docx")
+BATCH_MAX_DOCUMENTS = 100  # documents accepted by one /upload/batch job, counting zip members
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))  # per document
+BATCH_MAX_UPLOAD_BYTES = int(os.environ.get("BATCH_MAX_UPLOAD_BYTES", 1024 * 1024 * 1024))  # per /upload/batch request, and unzipped
+PDF_SKIP_PAGES = 8  # cover, index and legal notices
+PDF_PAGES_PER_TASK = 16  # page range handed to each extraction worker
+EXTRACT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+CACHE_DIR = BASE_DIR / "cache"
+JOB_STORE_BACKEND = os.environ.get("JOB_STORE", "sqlite")  # "sqlite" (shared by all workers) or "memory"
+JOB_STORE_PATH = Path(os.environ.get("JOB_STORE_PATH", BASE_DIR / "jobs.db"))
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", 24 * 3600))  # finished jobs and their files are dropped after this
+# "inline" runs jobs as background tasks of the web process; "queue" leaves them to worker.py processes
+WORKER_MODE = os.environ.get("WORKER_MODE", "inline")
+TASK_LEASE_SECONDS = float(os.environ.get("TASK_LEASE_SECONDS", "60"))  # a worker must heartbeat within this
+TASK_MAX_ATTEMPTS = int(os.environ.get("TASK_MAX_ATTEMPTS", "3"))  # claims before a job whose worker keeps dying is failed
+JOB_HEARTBEAT_SECONDS = 30.0  # inline mode: how often a scheduled job's record is touched while it waits or runs
+# An in_progress job untouched for this long, and not held by the task queue, was orphaned by a dead process and can be resumed
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "180"))
+QUESTION_BANK_BACKEND = os.environ.get("QUESTION_BANK", "sqlite")  # "sqlite" or "off"
+QUESTION_BANK_PATH = Path(os.environ.get("QUESTION_BANK_PATH", BASE_DIR / "questions.db"))
+# Per job: "reuse" banked questions first, only generate "new" ones (still deduped against the bank), or leave the bank "off"
+QUESTION_BANK_MODES = ("reuse", "new", "off")
+# Admission control: uploads get 429 + Retry-After once this much work is waiting
+MAX_RUNNING_JOBS = int(os.environ.get("MAX_RUNNING_JOBS", "4"))  # inline mode: jobs running at once in each web process
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", "50"))
+MAX_QUEUED_JOBS_PER_CLIENT = int(os.environ.get("MAX_QUEUED_JOBS_PER_CLIENT", "10"))
+CLIENT_ID_HEADER = os.environ.get("CLIENT_ID_HEADER", "X-Client-Id")  # identifies clients for fair queuing; the peer address otherwise
 
-# Initialize OpenAI client
-_client = openai.OpenAI(api_key="THE_KEY")
+SSE_POLL_SECONDS = 1.0  # how often event streams re-check the store for events written by other workers
+SSE_KEEPALIVE_SECONDS = 15.0
+
+# Job records, events and questions
+JOBS: JobStore = open_job_store(JOB_STORE_BACKEND, JOB_STORE_PATH, JOB_TTL_SECONDS)
+
+# Open /jobs/{job_id}/events streams in this process, woken as soon as an event is stored
+_event_waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+def _wake_event_waiters(job_id: str, event_id: int) -> None:
+    for loop, wake in _event_waiters.get(job_id, ()):
+        loop.call_soon_threadsafe(wake.set)
+
+JOBS.listeners.append(_wake_event_waiters)
+
+def _remove_job_files(job_id: str) -> None:
+    """Delete what a job leaves on disk: its uploads, extracted text, checkpoint and export artifacts."""
+    for path in (*UPLOAD_DIR.glob(f"{job_id}_*"), *TEXT_DIR.glob(f"{job_id}.*"), *OUTPUT_DIR.glob(f"{job_id}-*")):
+        path.unlink(missing_ok=True)
+    shutil.rmtree(UPLOAD_DIR / job_id, ignore_errors=True)  # batch uploads
+
+JOBS.evict_listeners.append(_remove_job_files)
+
+# Durable task queue shared with worker processes (queue mode only)
+QUEUE: Optional[TaskQueue] = None
+if WORKER_MODE == "queue":
+    if JOB_STORE_BACKEND != "sqlite":
+        raise ValueError("WORKER_MODE=queue needs the sqlite job store so workers can share jobs")
+    QUEUE = open_task_queue("sqlite", JOB_STORE_PATH, TASK_MAX_ATTEMPTS)
+elif WORKER_MODE != "inline":
+    raise ValueError(f"Unknown worker mode: {WORKER_MODE}")
+
+# Questions kept across jobs per source document; later jobs on the same document reuse and dedupe against them
+BANK: Optional[QuestionBank] = open_question_bank(QUESTION_BANK_BACKEND, QUESTION_BANK_PATH)
+
+# Refuses work past the queue caps; in inline mode also starts waiting jobs round-robin across clients
+ADMISSION = AdmissionController(MAX_RUNNING_JOBS, MAX_QUEUED_JOBS, MAX_QUEUED_JOBS_PER_CLIENT)
+
+EXTRACT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Extracted text and chunk lists keyed by the SHA-256 of the uploaded bytes
+_extract_cache = DiskCache(CACHE_DIR / "extract", EXTRACT_CACHE_MAX_BYTES)
+
+# Process pool for CPU-bound text extraction, created on first use
+_extract_pool: Optional[ProcessPoolExecutor] = None
+
+MODEL = "gpt-3.5-turbo-0125"
+# Source-text tokens per chunk (one chunk is sent with each generation request)
+MODEL_CHUNK_TOKENS = {"gpt-3.5-turbo-0125": 600}
+DEFAULT_CHUNK_TOKENS = 600
+CHUNK_OVERLAP_TOKENS = 60  # trailing context repeated at the start of the next chunk
+MODEL_MAX_OUTPUT_TOKENS = {"gpt-3.5-turbo-0125": 4096}
+QUESTION_BATCH_MAX = 15  # upper bound on questions requested per LLM call; the actual size adapts
+JOB_TOKEN_BUDGET = int(os.environ.get("JOB_TOKEN_BUDGET", "0"))  # prompt + completion tokens a job may spend on generation, 0 = unlimited
+JOB_MAX_INFLIGHT = 8  # concurrent LLM calls per job
+MAX_TOPUP_ROUNDS = 6  # rounds of re-planning for the shortfall left by duplicates/failures
+DEDUPE_THRESHOLD = float(os.environ.get("DEDUPE_THRESHOLD", "0.85"))  # word-overlap similarity above which questions are duplicates
+TRANSLATION_BATCH_CHARS = 6000  # source characters packed into one translation request
+TRANSLATION_MAX_TOKENS = 4000  # model output limit
+TRANSLATION_MEMO_SIZE = 20000
+
+# (text, source language, target language) -> translation, least recently used first
+_translation_memo: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+
+# Learns completion tokens per question per language and sizes batches/max_tokens from it
+_batch_sizer = BatchSizer(MODEL_MAX_OUTPUT_TOKENS, max_batch=QUESTION_BATCH_MAX)
+
+# Shared async LLM dispatcher: one pooled client, global concurrency/TPM budget and retries.
+# OPENAI_BASE_URL can point at a local OpenAI-compatible server for testing.
+# LLM_CACHE_MODE: "off", "readwrite" (reuse responses to identical prompts) or "replay" (offline, cache only).
+_llm = LLMDispatcher(
+    api_key=os.environ.get("OPENAI_API_KEY", "THE_KEY"),
+    base_url=os.environ.get("OPENAI_BASE_URL"),
+    max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "8")),
+    tokens_per_minute=int(os.environ.get("LLM_TOKENS_PER_MINUTE", "160000")),
+    cache=DiskCache(CACHE_DIR / "llm", int(os.environ.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))),
+    cache_mode=os.environ.get("LLM_CACHE_MODE", "readwrite"),
+)
+
+# Process-wide metrics served on /metrics; per-job totals are also kept on the job record
+METRICS = Metrics()
+METRICS.histogram("questgen_stage_seconds", "Time spent per pipeline stage.")
+METRICS.histogram("questgen_llm_queue_seconds", "Time LLM requests waited for a concurrency slot and token budget.")
+METRICS.histogram("questgen_llm_latency_seconds", "LLM request latency, excluding queueing.")
+METRICS.counter("questgen_llm_requests_total", "LLM requests completed.")
+METRICS.counter("questgen_llm_retries_total", "LLM request retries after rate limits or server errors.")
+METRICS.counter("questgen_llm_tokens_total", "LLM tokens used.")
+METRICS.counter("questgen_questions_total", "Generated questions by outcome.")
+METRICS.counter("questgen_jobs_total", "Finished jobs by status.")
+
+# Pipeline stages timed per job; each is kept on the job as <stage>_seconds
+STAGES = ("extract_queue", "extract", "split", "generate", "llm_queue", "llm", "parse", "translate", "export")
+
+async def _add_stage_time(job_id: str, stage: str, seconds: float) -> None:
+    METRICS.observe("questgen_stage_seconds", seconds, stage=stage)
+    await asyncio.to_thread(JOBS.increment, job_id, f"{stage}_seconds", seconds)
+
+@asynccontextmanager
+async def _span(job_id: str, stage: str):
+    """Time the enclosed block as one span of ``stage`` for the job."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        await _add_stage_time(job_id, stage, time.perf_counter() - started)
+
+async def _record_llm_call(job_id: str, stats: Dict[str, Any]) -> None:
+    """Dispatcher observer: account tokens, retries, queueing and latency to the job in one store write."""
+    model, cached = stats["model"], stats["cached"]
+    METRICS.inc("questgen_llm_requests_total", model=model, cached=str(cached).lower())
+    counters = {"llm_cached" if cached else "llm_requests": 1}
+    if not cached:
+        if stats["retries"]:
+            METRICS.inc("questgen_llm_retries_total", stats["retries"], model=model)
+            counters["llm_retries"] = stats["retries"]
+        for kind in ("prompt", "completion"):
+            tokens = stats[f"{kind}_tokens"]
+            if tokens:
+                METRICS.inc("questgen_llm_tokens_total", tokens, model=model, type=kind)
+                counters[f"{kind}_tokens"] = tokens
+        METRICS.observe("questgen_llm_queue_seconds", stats["queue_seconds"], model=model)
+        METRICS.observe("questgen_llm_latency_seconds", stats["latency_seconds"], model=model)
+        for stage, seconds in (("llm_queue", stats["queue_seconds"]), ("llm", stats["latency_seconds"])):
+            METRICS.observe("questgen_stage_seconds", seconds, stage=stage)
+            counters[f"{stage}_seconds"] = seconds
+    await asyncio.to_thread(JOBS.increment_many, job_id, counters)
+
+_llm.observers.append(_record_llm_call)
+
+def _estimate_eta(job: Dict[str, Any]) -> int:
+    """Seconds left, extrapolated from how fast the current stage has been moving."""
+    if job["status"] != "in_progress":
+        return 0
+    now = time.time()
+    generate_started = job.get("generate_started_at")
+    if generate_started is None:
+        # Still extracting: extrapolate from the pages done so far
+        pages_done, pages_total = job.get("pages_done", 0), job.get("pages_total", 0)
+        if not pages_done or not pages_total:
+            return 0
+        return int((now - job.get("start_time", now)) * (pages_total - pages_done) / pages_done)
+    # Generation covers the 5-80% progress band; past it, extrapolate over the whole job
+    generated = (job["progress"] - 5) / 75
+    if 0 < generated < 1:
+        return int((now - generate_started) * (1 - generated) / generated)
+    progress = job["progress"] / 100
+    if progress <= 0:
+        return 0
+    return int((now - job.get("start_time", generate_started)) * (1 - progress) / progress)
+
+def _queue_backlog(client: str) -> Tuple[int, int, int]:
+    """``(queued, running, queued for client)`` from the task queue, calibrating the admission estimates."""
+    ADMISSION.calibrate(QUEUE.average_seconds())
+    return QUEUE.backlog(client)
+
+async def _admit(client: str) -> None:
+    """Raise Saturated if no more work can be queued for ``client`` right now."""
+    if QUEUE is not None:
+        # Counts come from the queue database, so keep the queries off the event loop
+        queued, running, client_queued = await asyncio.to_thread(_queue_backlog, client)
+        capacity = max(running, 1)  # busy worker slots
+    else:
+        queued, _, client_queued = ADMISSION.backlog(client)
+        capacity = ADMISSION.max_running
+    ADMISSION.check(queued, client_queued, capacity)
+
+async def _admit_request(request: Request) -> str:
+    """Admission check for endpoints that start jobs; returns the client key used for fair queuing."""
+    client = client_key(request.scope, CLIENT_ID_HEADER)
+    try:
+        await _admit(client)
+    except Saturated as exc:
+        raise HTTPException(status_code=429, detail=exc.detail, headers={"Retry-After": str(exc.retry_after)})
+    return client
+
+def _queued_task_status(job_id: str) -> Tuple[Optional[int], int]:
+    """``(position, busy worker slots)`` of a job in the task queue."""
+    position = QUEUE.position(job_id)
+    if position is None:
+        return None, 0
+    ADMISSION.calibrate(QUEUE.average_seconds())
+    return position, max(QUEUE.backlog("")[1], 1)
+
+async def _queue_status(job_id: str) -> Tuple[Optional[int], Optional[int]]:
+    """The job's place in the wait line (0 = next to start) and the estimated seconds until it starts."""
+    if QUEUE is not None:
+        position, capacity = await asyncio.to_thread(_queued_task_status, job_id)
+        if position is None:
+            return None, None
+    else:
+        # Jobs waiting in another web process are not visible here
+        position = ADMISSION.position(job_id)
+        if position is None:
+            return None, None
+        capacity = ADMISSION.max_running
+    return position, ADMISSION.wait_seconds(position, capacity)
 
 # --- FastAPI app setup ---
-app = FastAPI(title="QuestGen Flow Backend", version="0.1.0")
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    yield
+    # uvicorn re-raises SIGTERM after a graceful shutdown, so atexit hooks never get to stop the pool's workers
+    if _extract_pool is not None:
+        await asyncio.to_thread(_extract_pool.shutdown, cancel_futures=True)
+
+app = FastAPI(title="QuestGen Flow Backend", version="0.1.0", lifespan=_lifespan)
+
+# Turn uploads away (429 when saturated, 413 when too large) before their bodies are read
+app.add_middleware(
+    UploadGate,
+    limits={"/upload": MAX_UPLOAD_BYTES, "/upload/batch": BATCH_MAX_UPLOAD_BYTES},
+    admit=_admit,
+    client_header=CLIENT_ID_HEADER,
+)
 
 # Allow local dev frontend to call the backend
 app.add_middleware(
@@ -48,63 +309,157 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def generate_excel(job_id: str, questions: List[Dict]) -> None:
-    """Generate Excel file from questions"""
-    try:
-        df = pd.json_normalize(questions)
-        excel_path = TEXT_DIR / f"{job_id}.xlsx"
-        df.to_excel(excel_path, index=False)
-        JOBS[job_id]["excel_file"] = str(excel_path.relative_to(Path(__file__).resolve().parent))
-    except Exception as e:
-        print(f"Failed to create Excel: {e}")
-        JOBS[job_id]["logs"] = ["Failed to create Excel file"]
-
-def _extract_text(file_path: Path) -> str:
-    """Extract raw text from PDF or DOCX file."""
-    if file_path.suffix.lower() == '.pdf':
-        with pdfplumber.open(file_path) as pdf:
-            # Skip the first 8 pages, which often contain cover, index, or legal notices
-            pages_to_read = pdf.pages[8:] if len(pdf.pages) > 8 else pdf.pages
-            # Some pages may not have any extracted text (returns None), so replace with empty string
-            text = "\n\n".join((page.extract_text() or "") for page in pages_to_read)
-    elif file_path.suffix.lower() == '.docx':
-        text = docx2txt.process(file_path)
+def _iter_job_questions(job_id: str):
+    """Yield a job's questions page by page so exports never hold the whole set in memory."""
+    offset = 0
+    while True:
+        page = JOBS.questions(job_id, offset=offset, limit=EXPORT_PAGE_SIZE)
+        if not page:
+            return
+        yield from page
+        offset += len(page)
+
+def _export_row(q: Dict[str, Any], with_document: bool = False) -> List[Any]:
+    options = q.get('options', {})
+    row = [
+        q.get('id'),
+        q.get('question'),
+        options.get('A'),
+        options.get('B'),
+        options.get('C'),
+        options.get('D'),
+        q.get('correct_answer'),
+        q.get('explanation'),
+        q.get('topic'),
+    ]
+    if with_document:
+        row.append(q.get('document'))
+    return row
+
+def _export_job(job_id: str, fmt: str, version: int) -> Path:
+    """Write (or reuse) the job's export artifact for the given questions version."""
+    path = OUTPUT_DIR / f"{job_id}-v{version}.{fmt}"
+    if path.exists():
+        return path
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    # Batch jobs say which document each question came from
+    with_document = bool((JOBS.get(job_id, include_logs=False, include_questions=False) or {}).get("documents"))
+    columns = EXPORT_COLUMNS + ['Document'] if with_document else EXPORT_COLUMNS
+    if fmt == "xlsx":
+        # Write-only workbooks stream rows to disk instead of building the sheet in memory
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Questions")
+        sheet.append(columns)
+        for q in _iter_job_questions(job_id):
+            sheet.append(_export_row(q, with_document))
+        workbook.save(tmp_path)
+    elif fmt == "csv":
+        with tmp_path.open("w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for q in _iter_job_questions(job_id):
+                writer.writerow(_export_row(q, with_document))
     else:
-        raise HTTPException(status_code=400, detail="Unsupported file type")
-    return text.strip()
-
-def _split_text(text: str) -> List[str]:
-    """Split text into chunks of approximately 2000 characters."""
-    # Split by paragraphs
-    paragraphs = text.split('\n\n')
-    
-    # Group paragraphs into chunks
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    for para in paragraphs:
-        para_length = len(para)
-        if current_length + para_length <= 2000:
-            current_chunk.append(para)
-            current_length += para_length
-        else:
-            if current_chunk:
-                chunks.append('\n\n'.join(current_chunk))
-            current_chunk = [para]
-            current_length = para_length
-    
-    if current_chunk:
-        chunks.append('\n\n'.join(current_chunk))
-    
-    # Limit the number of chunks to reduce token usage
+        with tmp_path.open("w", encoding="utf-8") as f:
+            for q in _iter_job_questions(job_id):
+                f.write(json.dumps(q, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+    # Drop artifacts of older question versions
+    for stale in OUTPUT_DIR.glob(f"{job_id}-v*.{fmt}"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return path
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    if _extract_pool is None:
+        # Spawn rather than fork: forking this multithreaded process could copy locks held by other
+        # threads, and each worker would carry a copy of the whole app
+        _extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _extract_pool
+
+def _pdf_page_ranges(page_count: int) -> List[tuple]:
+    """Page ranges to extract, skipping the first pages which often contain cover, index, or legal notices."""
+    first = PDF_SKIP_PAGES if page_count > PDF_SKIP_PAGES else 0
+    return [(start, min(start + PDF_PAGES_PER_TASK, page_count)) for start in range(first, page_count, PDF_PAGES_PER_TASK)]
+
+async def _extract_text_async(job_id: str, file_path: Path) -> str:
+    """Extract text in the process pool, spreading PDF page ranges across workers.
+
+    Per-page progress is added to the job's pages_done / pages_total fields, so the
+    documents of a batch job extracting side by side report their combined progress.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_extract_pool()
+
+    async def run_in_pool(fn, *args):
+        submitted = time.time()
+        started, result = await loop.run_in_executor(pool, timed, fn, *args)
+        await _add_stage_time(job_id, "extract_queue", max(started - submitted, 0.0))
+        return result
+
+    if file_path.suffix.lower() != '.pdf':
+        return await run_in_pool(extract_text, file_path, PDF_SKIP_PAGES)
+
+    page_count = await run_in_pool(count_pdf_pages, file_path)
+    ranges = _pdf_page_ranges(page_count)
+    pages_total = await asyncio.to_thread(JOBS.increment, job_id, "pages_total", sum(end - start for start, end in ranges))
+
+    def record_pages(count: int) -> None:
+        pages_done = JOBS.increment(job_id, "pages_done", count)
+        progress = min(int(5 * pages_done / max(pages_total, 1)), 5)
+        JOBS.update(job_id, progress=progress)
+        JOBS.append_event(job_id, "progress", {"status": "in_progress", "progress": progress, "step": 1,
+                                               "pages_done": pages_done, "pages_total": pages_total})
+
+    async def extract_range(start: int, end: int) -> List[str]:
+        pages = await run_in_pool(extract_pdf_pages, file_path, start, end)
+        await asyncio.to_thread(record_pages, len(pages))
+        return pages
+
+    results = await asyncio.gather(*(extract_range(start, end) for start, end in ranges))
+    return "\n\n".join("\n\n".join(pages) for pages in results).strip()
+
+def _checkpoint(job_id: str) -> JobCheckpoint:
+    """Durable record of the job's accepted questions, kept next to TEXT_DIR/<job_id>.txt."""
+    return JobCheckpoint(TEXT_DIR / f"{job_id}.checkpoint.jsonl")
+
+def _chunk_tokens(model: str = MODEL) -> int:
+    return MODEL_CHUNK_TOKENS.get(model, DEFAULT_CHUNK_TOKENS)
+
+def _chunker_key(model: str = MODEL) -> str:
+    """Identifies the chunking settings, so cached chunk lists are only reused when they match."""
+    return f"{model}:{_chunk_tokens(model)}:{CHUNK_OVERLAP_TOKENS}:v{CHUNKER_VERSION}"
+
+def _split_text(text: str, model: str = MODEL) -> List[str]:
+    """Split text into chunks that fit the model's per-request token budget."""
     # Return all chunks so later logic can sample across the document
-    return chunks
+    return list(iter_chunks(text, _chunk_tokens(model), CHUNK_OVERLAP_TOKENS, token_counter(model)))
 
-def _generate_questions(executor: ThreadPoolExecutor, context: str, question_language: str, n_questions: int, start_id: int, job_id: str) -> List[Dict[str, Any]]:
-    try:
-        # Create prompt
-        prompt = f"""You are a knowledgeable teacher preparing an exam ONLY on the information contained in the given book excerpt.  
+async def _record_parse_stats(job_id: str, stream, parser: JSONObjectStream, valid_questions: List[Dict[str, Any]], error: Optional[Exception], parse_seconds: float) -> None:
+    """Account a generation reply to the job in one store write: parse time, tokens spent, and
+    whether it parsed cleanly, with the completion tokens spent on unusable text."""
+    failed = error is not None or parser.errors > 0 or parser.pending or stream.finish_reason == "length" \
+        or (parser.total_chars > 0 and not valid_questions)
+    completion_tokens = getattr(stream.usage, "completion_tokens", 0) or 0
+    wasted = 0
+    if completion_tokens and parser.total_chars:
+        wasted = round(completion_tokens * (1 - parser.parsed_chars / parser.total_chars))
+    METRICS.observe("questgen_stage_seconds", parse_seconds, stage="parse")
+    counters = {"llm_replies": 1, "parse_seconds": parse_seconds}
+    if failed:
+        counters["parse_failures"] = 1
+    if wasted:
+        counters["wasted_tokens"] = wasted
+    if stream.usage is not None and not stream.from_cache:
+        counters["generation_tokens"] = stream.usage.total_tokens
+    await asyncio.to_thread(JOBS.increment_many, job_id, counters)
+    if failed:
+        reason = f"stream error: {error}" if error else ("truncated" if stream.finish_reason == "length" else "malformed")
+        await asyncio.to_thread(JOBS.append_log, job_id, f"Reply parsed partially ({reason}, {len(valid_questions)} questions kept)")
+
+def _question_prompt(context: str, question_language: str, n_questions: int) -> str:
+    return f"""You are a knowledgeable teacher preparing an exam ONLY on the information contained in the given book excerpt.  
 Your goal is to create exactly {n_questions} high-quality multiple-choice questions that faithfully test a reader’s knowledge of the material — no trivia outside the scope of the book.  
 Distribute the questions so they reflect content from the beginning, middle and end of the text. If the total number of questions requested is more than 50, ensure the distribution samples several times across the full text.  
 
@@ -135,477 +490,1127 @@ Format the response EXACTLY as this JSON array:
   }}
 ]"""
 
+async def _generate_questions(context: str, question_language: str, n_questions: int, start_id: int, job_id: str, attempt: int = 0, max_tokens: Optional[int] = None, banked: int = 0) -> List[Dict[str, Any]]:
+    try:
+        prompt = _question_prompt(context, question_language, n_questions)
+        if max_tokens is None:
+            max_tokens = _batch_sizer.max_tokens(MODEL, question_language, n_questions)
 
-        
-        # Generate questions
-        chat_resp = _client.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
-            messages=[{"role": "user", "content": prompt}],
+        # Stream the reply and keep every complete question as it arrives, so a
+        # truncated or partly malformed reply still yields its valid items
+        stream = _llm.chat_stream(
+            job_id,
+            [{"role": "user", "content": prompt}],
+            model=MODEL,
             temperature=0.2,
-            max_tokens=2000 if n_questions > 5 else 1000,
+            max_tokens=max_tokens,
+            # Once banked questions seed dedupe, an earlier job's cached replies would all be dropped as
+            # duplicates; the bank grows with every accepted question, so its size keys a fresh reply
+            cache_variant=f"bank{banked}:{attempt}" if banked else attempt,
+            # max_tokens follows the learned tokens per question; the batch size is in the prompt
+            cache_by_max_tokens=False,
             timeout=30
         )
-        content = chat_resp.choices[0].message.content.strip()
-        
-        # Parse and validate questions
+        parser = JSONObjectStream()
+        valid_questions = []
+        stream_error = None
+        parse_seconds = 0.0
         try:
-            batch_questions = json.loads(content)
-            if not isinstance(batch_questions, list):
-                raise ValueError("Invalid question format")
-            
-            valid_questions = []
-            for q in batch_questions:
-                if isinstance(q, dict) and \
-                   'question' in q and 'options' in q and 'correct_answer' in q and 'explanation' in q:
-                    # Assign sequential IDs
-                    q['id'] = start_id + len(valid_questions)
-                    valid_questions.append(q)
-            
-            if valid_questions:
-                JOBS[job_id]["logs"].append(f"Generated {len(valid_questions)} questions")
-                return valid_questions
-            else:
-                return []
+            async for delta in stream:
+                parse_started = time.perf_counter()
+                for obj in parser.feed(delta):
+                    for q in question_objects(obj):
+                        if isinstance(q, dict) and \
+                           'question' in q and 'options' in q and 'correct_answer' in q and 'explanation' in q:
+                            # Assign sequential IDs
+                            q['id'] = start_id + len(valid_questions)
+                            valid_questions.append(q)
+                parse_seconds += time.perf_counter() - parse_started
         except Exception as e:
-            JOBS[job_id]["logs"].append(f"Error parsing questions: {str(e)}")
-            return []
-            
+            if not parser.total_chars:
+                raise
+            stream_error = e
+
+        await _record_parse_stats(job_id, stream, parser, valid_questions, stream_error, parse_seconds)
+        if stream.usage is not None:
+            _batch_sizer.observe(MODEL, question_language, len(valid_questions), stream.usage.completion_tokens,
+                                 truncated=stream.finish_reason == "length")
+        if valid_questions:
+            await asyncio.to_thread(JOBS.append_log, job_id, f"Generated {len(valid_questions)} questions")
+        return valid_questions
+
     except Exception as e:
-        JOBS[job_id]["logs"].append(f"Error generating questions: {str(e)}")
+        await asyncio.to_thread(JOBS.append_log, job_id, f"Error generating questions: {str(e)}")
         return []
 
-def _translate_explanation(explanation: str, question_language: str, explanation_language: str) -> str:
+def _translation_max_tokens(chars: int) -> int:
+    # Translations can run longer than the source; leave headroom so nothing is cut off
+    return min(TRANSLATION_MAX_TOKENS, chars // 2 + 100)
+
+def _memo_get(key: Tuple[str, str, str]) -> Optional[str]:
+    value = _translation_memo.get(key)
+    if value is not None:
+        _translation_memo.move_to_end(key)
+    return value
+
+def _memo_put(key: Tuple[str, str, str], value: str) -> None:
+    _translation_memo[key] = value
+    _translation_memo.move_to_end(key)
+    while len(_translation_memo) > TRANSLATION_MEMO_SIZE:
+        _translation_memo.popitem(last=False)
+
+async def _translate_explanation(explanation: str, question_language: str, explanation_language: str, job_id: str) -> str:
     try:
         translation_prompt = f"Translate this explanation from {question_language} to {explanation_language}:\n\n{explanation}"
-        translation_resp = _client.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
-            messages=[{"role": "user", "content": translation_prompt}],
+        translation_resp = await _llm.chat(
+            job_id,
+            [{"role": "user", "content": translation_prompt}],
+            model=MODEL,
             temperature=0.2,
-            max_tokens=200,
+            max_tokens=_translation_max_tokens(len(explanation)),
             timeout=30
         )
         return translation_resp.choices[0].message.content.strip()
     except Exception:
         return explanation
 
-async def _generate_async(job_id: str, raw_text: str, question_language: str, explanation_language: str, n_questions: int, output_format: str):
-    def update_job_status(status: str, progress: int, step: int, log_message: str):
-        JOBS[job_id]["status"] = status
-        JOBS[job_id]["progress"] = progress
-        JOBS[job_id]["step"] = step
-        JOBS[job_id]["logs"].append(log_message)
+async def _translate_batch(items: Dict[str, str], question_language: str, explanation_language: str, job_id: str) -> Dict[str, str]:
+    """Translate many explanations in one JSON request. Returns only the ids that came back intact."""
+    translation_prompt = f"""Translate each value of the following JSON object from {question_language} to {explanation_language}.
+Return a JSON object with exactly the same keys, where each value is the full translation. Do not add, drop or merge keys.
+
+{json.dumps(items, ensure_ascii=False)}"""
+    try:
+        translation_resp = await _llm.chat(
+            job_id,
+            [{"role": "user", "content": translation_prompt}],
+            model=MODEL,
+            temperature=0.2,
+            max_tokens=_translation_max_tokens(sum(len(text) for text in items.values())),
+            response_format={"type": "json_object"},
+            timeout=60
+        )
+        translated = json.loads(translation_resp.choices[0].message.content)
+    except Exception as e:
+        await asyncio.to_thread(JOBS.append_log, job_id, f"Batched translation failed, falling back per item: {str(e)}")
+        return {}
+    if not isinstance(translated, dict):
+        return {}
+    return {key: value.strip() for key, value in translated.items() if key in items and isinstance(value, str) and value.strip()}
+
+async def _translate_explanations(explanations: List[str], question_language: str, explanation_language: str, job_id: str) -> List[str]:
+    """Translate explanations in as few requests as possible.
+
+    Repeated texts are served from the translation memo, the rest are packed into
+    JSON batches of up to TRANSLATION_BATCH_CHARS and mapped back by id. Only items
+    missing from a batch reply are retried one by one.
+    """
+    results: List[Optional[str]] = [None] * len(explanations)
+    pending: Dict[str, str] = {}
+    for idx, text in enumerate(explanations):
+        cached = _memo_get((text, question_language, explanation_language))
+        if cached is not None:
+            results[idx] = cached
+        else:
+            pending[str(idx)] = text
+
+    batches: List[Dict[str, str]] = []
+    batch_chars = TRANSLATION_BATCH_CHARS
+    for key, text in pending.items():
+        if batch_chars + len(text) > TRANSLATION_BATCH_CHARS:
+            batches.append({})
+            batch_chars = 0
+        batches[-1][key] = text
+        batch_chars += len(text)
+
+    replies = await asyncio.gather(*(_translate_batch(batch, question_language, explanation_language, job_id) for batch in batches))
+    translated = {key: value for reply in replies for key, value in reply.items()}
+
+    missing = [key for key in pending if key not in translated]
+    fallbacks = await asyncio.gather(*(_translate_explanation(pending[key], question_language, explanation_language, job_id) for key in missing))
+    translated.update(zip(missing, fallbacks))
+
+    for key, text in pending.items():
+        results[int(key)] = translated[key]
+        if key not in missing or translated[key] != text:
+            _memo_put((text, question_language, explanation_language), translated[key])
+    return results
+
+def _plan_batches(n_questions: int, n_chunks: int, batch_size: int, round_no: int = 0, topic_index: Optional["TopicIndex"] = None) -> List[Tuple[int, int]]:
+    """Split n_questions into (chunk_index, batch_size) pairs.
+
+    With a topic index, chunks are drawn so each topic cluster is covered in proportion to its
+    size and top-up rounds continue with chunks not used yet. Otherwise batches are spread evenly
+    over the chunks and each top-up round shifts the offsets so retries target different content.
+    """
+    n_batches = -(-n_questions // batch_size)
+    sizes = [min(batch_size, n_questions - i * batch_size) for i in range(n_batches)]
+    if topic_index is not None:
+        return list(zip(topic_index.next_chunks(n_batches), sizes))
+    shift = int(round_no * 0.618 * n_chunks)  # golden-ratio step keeps successive rounds apart
+    return [((i * n_chunks // n_batches + shift) % n_chunks, size) for i, size in enumerate(sizes)]
+
+def _document_quotas(n_questions: int, weights: List[int]) -> List[int]:
+    """Split n_questions across documents in proportion to their weights (chunk counts), largest remainders first."""
+    total = sum(weights)
+    if total <= 0:
+        return [0] * len(weights)
+    exact = [n_questions * weight / total for weight in weights]
+    quotas = [int(share) for share in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: (quotas[i] - exact[i], i))
+    for i in by_remainder[:n_questions - sum(quotas)]:
+        quotas[i] += 1
+    return quotas
+
+def _generation_progress(generated: int, n_questions: int) -> int:
+    """Map generated/requested onto the 5-80% band between chunking and translation."""
+    return 5 + int(75 * min(generated, n_questions) / max(n_questions, 1))
+
+async def _generate_async(job_id: str, raw_text: str, question_language: str, explanation_language: str, n_questions: int, output_format: str, chunks: Optional[List[str]] = None, documents: Optional[List[Dict[str, Any]]] = None, content_hash: Optional[str] = None, question_bank: str = "reuse"):
+    """Generate, finalize and export the job's questions.
+
+    ``documents`` (batch jobs) lists the job's document records in chunk-pool order; each
+    owns the next ``chunks`` chunks of the pool and is given a quota of the questions in
+    proportion to that count. Without it the whole pool is treated as one document, whose
+    hash is ``content_hash``. Documents with a known hash draw on the question bank
+    according to ``question_bank`` (one of QUESTION_BANK_MODES).
+    """
+    def set_status(status: str, progress: int, step: int, log_message: str) -> None:
+        JOBS.update(job_id, status=status, progress=progress, step=step)
+        JOBS.append_event(job_id, "progress", {"status": status, "progress": progress, "step": step})
+        JOBS.append_log(job_id, log_message)
+
+    async def update_job_status(status: str, progress: int, step: int, log_message: str):
+        await asyncio.to_thread(set_status, status, progress, step, log_message)
         print(f"Job {job_id}: {status} - {progress}% - Step {step} - {log_message}")
 
+    finalizing: List[asyncio.Task] = []
     try:
-        # Initialize job status
-        JOBS[job_id] = {
-            "status": "in_progress",
-            "progress": 0,
-            "step": 1,
-            "logs": ["Starting question generation"],
-            "questions": [],
-            "topics": [],
-            "done": False
-        }
-        update_job_status("in_progress", 0, 1, "Starting question generation")
+        # The job record is created by upload_document; extraction may already have logged into it
+        await asyncio.to_thread(JOBS.update, job_id, generate_started_at=time.time())
+        await update_job_status("in_progress", 5, 1, "Starting question generation")
         
         # Split text into chunks
-        chunks = _split_text(raw_text)
-        
-        # Track all existing question texts to avoid duplicates across batches
-        existing_question_texts = set()
-        
-        update_job_status("in_progress", 5, 1, f"Split text into {len(chunks)} chunks")
+        if chunks is None:
+            chunks = _split_text(raw_text)
         
-        # Initialize ThreadPoolExecutor for parallel processing
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            # Generate questions in parallel
-            # Choose representative chunks for initial generation to cover start/middle/end
-            if len(chunks) == 0:
-                chunks = [raw_text]
-            if n_questions <= 20 and len(chunks) >= 3:
-                indices = [0, len(chunks) // 2, -1]
-            elif n_questions >= 50 and len(chunks) >= 5:
-                indices = [0, len(chunks)//4, len(chunks)//2, (3*len(chunks))//4, -1]
-            else:
-                indices = [0]
-            selected_chunks = [chunks[i] for i in indices]
-
-            tasks = [
-                asyncio.get_event_loop().run_in_executor(
-                    executor,
-                    functools.partial(_generate_questions, executor, c, question_language, n_questions, 1, job_id)
-                )
-                for c in selected_chunks
-            ]
-            
-            update_job_status("in_progress", 20, 1, "Starting generation from first chunk")
-            
-            generated_questions = await asyncio.gather(*tasks)
-            generated_questions = [q for q in generated_questions[0] if q is not None]
-            
-            update_job_status("in_progress", 40, 1, f"Generated {len(generated_questions)} questions from first chunk")
-
-            # Generate questions in batches until we reach the exact number requested
-            current_count = len(generated_questions)
-            while current_count < n_questions:
-                # Calculate how many more questions we need
-                remaining_questions = n_questions - current_count
-                batch_size = min(remaining_questions, 5)  # Generate in batches of 5
-                
-                # Get the next chunk
-                chunk = chunks[len(generated_questions) // batch_size % len(chunks)]
-                
-                update_job_status("in_progress", 45, 2, f"Generating batch of {batch_size} questions")
-                
-                # Generate questions for this batch
-                batch = await asyncio.get_event_loop().run_in_executor(
-                    executor,
-                    functools.partial(_generate_questions, executor, chunk, question_language, batch_size, current_count + 1, job_id)
-                )
-                
-                # Filter out any None results
-                batch = [q for q in batch if q is not None]
-                
-                # Remove duplicates against all previously kept questions
-                unique_batch = []
-                similarity_threshold = 0.85  # word–overlap similarity threshold
-
-                def calculate_similarity(q1:str, q2:str)->float:
-                    words1 = set(q1.split())
-                    words2 = set(q2.split())
-                    overlap = words1 & words2
-                    return len(overlap) / max(len(words1), len(words2)) if max(len(words1), len(words2)) else 0.0
-
-                for question in batch:
-                    qt_lower = question['question'].lower()
-                    is_duplicate = False
-                    for existing in existing_question_texts:
-                        if calculate_similarity(qt_lower, existing) > similarity_threshold:
-                            is_duplicate = True
-                            break
-                    if not is_duplicate:
-                        unique_batch.append(question)
-                        existing_question_texts.add(qt_lower)
-                
-                # If we got no unique questions, try again with a different chunk
-                if not unique_batch:
-                    update_job_status("in_progress", 45, 2, "No unique questions in batch, trying different content")
-                    continue
-                
-                # Add unique questions to our total
-                generated_questions.extend(unique_batch)
-                current_count += len(unique_batch)
-                
-                # Update progress
-                progress = min(100, int((current_count / n_questions) * 100))
-                update_job_status("in_progress", progress, 2, f"Generated {len(unique_batch)} unique questions, total: {current_count}")
-                
-                # If we have exactly the right number, break
-                if current_count == n_questions:
-                    break
-                
-                # If we have too many, remove the extras
-                if current_count > n_questions:
-                    generated_questions = generated_questions[:n_questions]
-                    current_count = n_questions
-                    update_job_status("in_progress", 60, 2, f"Adjusted to exact number: {n_questions} questions")
+        # Near-duplicate index over every question kept so far in this job
+        question_index = QuestionIndex(DEDUPE_THRESHOLD)
+
+        # Questions checkpointed by an earlier run of this job (failed, or its worker died) are kept and
+        # only the missing count is generated. Finished ones are reused as they are; accepted ones that
+        # never finished alignment/translation are finalized again.
+        checkpoint = _checkpoint(job_id)
+        params, resumed_final, resumed_pending = await asyncio.to_thread(checkpoint.load)
+        generated_questions: List[Dict[str, Any]] = (resumed_final + resumed_pending)[:n_questions]
+        resumed_final = resumed_final[:n_questions]
+        resumed_pending = generated_questions[len(resumed_final):]
+        if generated_questions:
+            for idx, q in enumerate(generated_questions, start=1):
+                q['id'] = idx
+                question_index.add(q['question'])
+            await asyncio.to_thread(checkpoint.rewrite, params, resumed_final, resumed_pending)
+            await asyncio.to_thread(JOBS.set_questions, job_id, resumed_final)
+            await update_job_status("in_progress", _generation_progress(len(generated_questions), n_questions), 2,
+                              f"Resuming from checkpoint with {len(generated_questions)} questions")
+
+        async def accept_unique(doc: int, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            """Append the non-duplicate questions of a batch, up to n_questions and the document's quota. Returns the ones kept."""
+            kept = []
+            duplicates = 0
+            for question in batch:
+                if len(generated_questions) >= n_questions or doc_counts[doc] >= quotas[doc]:
                     break
-                
-                # If we're not making progress, try a different chunk
-                if len(unique_batch) < batch_size / 2:  # If we got less than half the expected questions
-                    update_job_status("in_progress", 45, 2, "Low unique questions, trying different content")
+                if not question_index.add_if_unique(question['question']):
+                    duplicates += 1
                     continue
-                
+                generated_questions.append(question)
+                doc_counts[doc] += 1
+                kept.append(question)
+            if duplicates:
+                await asyncio.to_thread(JOBS.increment, job_id, "duplicates_dropped", duplicates)
+                METRICS.inc("questgen_questions_total", duplicates, outcome="duplicate")
+            if kept:
+                METRICS.inc("questgen_questions_total", len(kept), outcome="accepted")
+            return kept
+        
+        await update_job_status("in_progress", 5, 1, f"Split text into {len(chunks)} chunks")
+        
+        if len(chunks) == 0:
+            chunks = [raw_text]
+
+        # Each document owns a contiguous range of the shared chunk pool and a share of the questions
+        if documents is None:
+            spans = [(0, len(chunks))]
+            doc_names: List[Optional[str]] = [None]
+        else:
+            spans, offset = [], 0
+            for doc in documents:
+                spans.append((offset, offset + doc.get("chunks", 0)))
+                offset += doc.get("chunks", 0)
+            doc_names = [doc["name"] for doc in documents]
+        doc_hashes = [doc.get("content_hash") for doc in documents] if documents is not None else [content_hash]
+        quotas = _document_quotas(n_questions, [end - start for start, end in spans])
+        doc_counts = [0] * len(spans)
+        doc_by_name = {name: doc for doc, name in enumerate(doc_names)}
+        for q in generated_questions:
+            doc_counts[doc_by_name.get(q.get('document'), 0)] += 1
+        exhausted = set()
+
+        async def publish_documents() -> None:
+            """Write per-document quotas and counts to the job record (batch jobs only)."""
+            if documents is None:
+                return
+            for doc, quota, count in zip(documents, quotas, doc_counts):
+                doc.update(quota=quota, questions=count, progress=int(100 * count / quota) if quota else 100)
+            await asyncio.to_thread(JOBS.update, job_id, documents=[dict(doc) for doc in documents])
 
-                # If we didn't get enough questions in this batch, keep trying
-                if len(batch) < batch_size:
-                    update_job_status("in_progress", 50, 2, f"Only got {len(batch)} questions in batch, trying again")
+        def reassign(doc: int) -> bool:
+            """Move a document's unmet quota to the other documents still producing questions."""
+            active = [i for i, (start, end) in enumerate(spans) if i != doc and i not in exhausted and end > start]
+            if not active:
+                return False
+            extra = quotas[doc] - doc_counts[doc]
+            quotas[doc] = doc_counts[doc]
+            for i, share in zip(active, _document_quotas(extra, [spans[i][1] - spans[i][0] for i in active])):
+                quotas[i] += share
+            return True
+
+        # Every banked question on these documents counts as already asked, so new ones are never
+        # repeats of earlier jobs; in "reuse" mode the least used ones also fill quotas before any LLM call
+        use_bank = BANK is not None and question_bank != "off" and any(doc_hashes)
+        reused: List[Dict[str, Any]] = []
+        banked = 0
+        if use_bank:
+            asked = {q['question'] for q in generated_questions}
+            reused_ids = []
+            for doc, doc_hash in enumerate(doc_hashes):
+                if doc_hash is None:
                     continue
-                
-                # If we have exactly the right number, break
-                if current_count == n_questions:
-                    break
-                
-                # If we have too many, remove the extras
-                if current_count > n_questions:
-                    generated_questions = generated_questions[:n_questions]
-                    current_count = n_questions
-                    update_job_status("in_progress", 60, 2, f"Adjusted to exact number: {n_questions} questions")
+                for entry_id, q in await asyncio.to_thread(BANK.entries, doc_hash, question_language):
+                    if q['question'] in asked:
+                        continue
+                    asked.add(q['question'])
+                    question_index.add(q['question'])
+                    banked += 1
+                    if question_bank == "reuse" and doc_counts[doc] < quotas[doc] and len(generated_questions) < n_questions:
+                        if documents is not None:
+                            q['document'] = doc_names[doc]
+                        q['id'] = len(generated_questions) + 1
+                        generated_questions.append(q)
+                        reused.append(q)
+                        reused_ids.append(entry_id)
+                        doc_counts[doc] += 1
+            if reused:
+                await asyncio.to_thread(BANK.mark_used, reused_ids)
+                await asyncio.to_thread(JOBS.increment, job_id, "bank_reused", len(reused))
+                METRICS.inc("questgen_questions_total", len(reused), outcome="reused")
+            if banked:
+                await update_job_status("in_progress", _generation_progress(len(generated_questions), n_questions), 1,
+                                  f"Question bank: reused {len(reused)} of {banked} banked questions")
+
+        async def bank_questions(batch: List[Dict[str, Any]]) -> None:
+            """Keep accepted questions in the bank as generated, before alignment and translation."""
+            if not use_bank:
+                return
+            by_hash: Dict[str, List[Dict[str, Any]]] = {}
+            for q in batch:
+                doc_hash = doc_hashes[doc_by_name.get(q.get('document'), 0)]
+                if doc_hash is not None:
+                    by_hash.setdefault(doc_hash, []).append(q)
+            for doc_hash, questions in by_hash.items():
+                await asyncio.to_thread(BANK.add, doc_hash, question_language, questions, job_id)
+
+        await publish_documents()
+
+        # Cluster each document's chunks into topics so batches cover it all instead of revisiting the same chunks
+        topic_indexes: List[Optional["TopicIndex"]] = [None] * len(spans)
+        if TopicIndex is not None:
+            for doc, (start, end) in enumerate(spans):
+                if end - start > 1:
+                    topic_indexes[doc] = await asyncio.to_thread(TopicIndex, chunks[start:end])
+            n_topics = sum(len(index) for index in topic_indexes if index is not None)
+            if n_topics:
+                await update_job_status("in_progress", 5, 1, f"Grouped {len(chunks)} chunks into {n_topics} topics")
+
+        # Bound this job's in-flight requests; the dispatcher also enforces the global cap
+        inflight = asyncio.Semaphore(JOB_MAX_INFLIGHT)
+
+        # Repeat requests for the same chunk within a job must not be answered from the response cache
+        prompt_attempts: Dict[Tuple[int, int], int] = {}
+
+        async def run_batch(doc: int, chunk_index: int, batch_size: int, max_tokens: int) -> Tuple[int, List[Dict[str, Any]]]:
+            attempt = prompt_attempts.get((chunk_index, batch_size), 0)
+            prompt_attempts[(chunk_index, batch_size)] = attempt + 1
+            async with inflight:
+                questions = await _generate_questions(chunks[chunk_index], question_language, batch_size, 1, job_id, attempt, max_tokens, banked)
+            for q in questions:
+                if q is not None:
+                    q['chunk'] = chunk_index - spans[doc][0]
+                    if documents is not None:
+                        q['document'] = doc_names[doc]
+            return doc, questions
+
+        async def within_budget(plan: List[Tuple[int, int, int]], max_tokens: int) -> List[Tuple[int, int, int]]:
+            """Drop the batches whose worst-case cost would exceed the job's remaining token budget."""
+            if JOB_TOKEN_BUDGET <= 0:
+                return plan
+            job = await asyncio.to_thread(JOBS.get, job_id, include_logs=False, include_questions=False)
+            remaining = JOB_TOKEN_BUDGET - (job or {}).get("generation_tokens", 0)
+            fitted = []
+            for doc, chunk_index, size in plan:
+                prompt = _question_prompt(chunks[chunk_index], question_language, size)
+                cost = LLMDispatcher.estimate_tokens([{"content": prompt}], max_tokens)
+                if cost > remaining:
                     break
+                remaining -= cost
+                fitted.append((doc, chunk_index, size))
+            return fitted
 
-            # Ensure we have exactly the requested number of questions
-            if len(generated_questions) != n_questions:
-                raise ValueError(f"Failed to generate exactly {n_questions} questions")
-
-            # Translate explanations in parallel if needed
-            if explanation_language.lower() != question_language.lower():
-                update_job_status("in_progress", 80, 3, "Starting translation for explanations")
-                
-                # Translate explanations in parallel
-                with ThreadPoolExecutor(max_workers=5) as executor:
-                    tasks = [
-                        asyncio.get_event_loop().run_in_executor(
-                            executor,
-                            functools.partial(_translate_explanation, q['explanation'], question_language, explanation_language)
-                        )
-                        for q in generated_questions
-                    ]
-                    
-                    update_job_status("in_progress", 90, 3, f"Starting translation for {len(tasks)} explanations")
-                    
-                    translated_explanations = await asyncio.gather(*tasks)
-                    
-                    # Update questions with translated explanations
-                    for q, explanation in zip(generated_questions, translated_explanations):
-                        q['explanation'] = explanation
-                    
-                    update_job_status("in_progress", 95, 3, "Finished translating explanations")
-
-            # Align correct_answer with the content of each explanation
-            for q in generated_questions:
-                try:
-                    explanation_lower = q['explanation'].lower()
-                    options = q['options']
-                    matched_letter = None
-                    # First, check if the explanation explicitly contains the option text
-                    for letter, text in options.items():
-                        if text.lower() in explanation_lower:
-                            matched_letter = letter
-                            break
-                    # If no option text is found, check for a direct mention of the option letter (A, B, C, D)
-                    if not matched_letter:
-                        letter_match = re.search(r'\b([ABCD])\b', explanation_lower)
-                        if letter_match:
-                            matched_letter = letter_match.group(1).upper()
-                    # If a match is found and differs from the current correct answer, update it
-                    if matched_letter and matched_letter in options and matched_letter != q['correct_answer']:
-                        q['correct_answer'] = matched_letter
-                except Exception:
-                    # If anything fails here, keep the original correct answer
-                    continue
-            update_job_status("in_progress", 96, 3, "Aligned correct answers with explanations")
-
-            # Ensure diverse distribution of correct answers
-            if len(generated_questions) > 1:
-                # Get all current correct answers
-                current_answers = [q['correct_answer'] for q in generated_questions]
-                
-                # Calculate answer distribution
-                answer_counts = {'A': 0, 'B': 0, 'C': 0, 'D': 0}
-                for answer in current_answers:
-                    answer_counts[answer] += 1
-                
-                # If any answer is overrepresented, redistribute
-                max_count = max(answer_counts.values())
-                if max_count > len(generated_questions) * 0.3:  # If any answer is more than 30% of total
-                    # Create a list of all possible answers
-                    all_answers = ['A', 'B', 'C', 'D']
-                    
-                    # Create a weighted list favoring less used answers
-                    weighted_answers = []
-                    for answer, count in answer_counts.items():
-                        # Add more instances of less used answers
-                        weighted_answers.extend([answer] * (4 - count))
-                    
-                    # Shuffle the weighted list
-                    random.shuffle(weighted_answers)
-                    
-                    # Redistribute answers while maintaining validity
-                    for i, q in enumerate(generated_questions):
-                        # Get current answer and options
-                        current_answer = q['correct_answer']
-                        options = q['options']
-                        
-                        # Find a new valid answer
-                        new_answer = current_answer
-                        attempts = 0
-                        max_attempts = 5  # Prevent infinite loops
-                        
-                        # Try weighted list first
-                        while attempts < max_attempts and weighted_answers:
-                            try:
-                                # Get a new answer from the weighted list
-                                new_answer = weighted_answers.pop(0)
-                                
-                                # Check if the new answer is valid
-                                if new_answer != current_answer and new_answer in options:
-                                    # Swap the options to maintain validity
-                                    temp = options[current_answer]
-                                    options[current_answer] = options[new_answer]
-                                    options[new_answer] = temp
-                                    
-                                    q['correct_answer'] = new_answer
-                                    break
-                            except IndexError:  # If weighted list is empty
-                                break
-                            
-                            attempts += 1
-                        
-                        # If weighted list failed, try random selection
-                        if new_answer == current_answer:
-                            for _ in range(max_attempts):
-                                # Get a random answer
-                                new_answer = random.choice(all_answers)
-                                
-                                # Check if the new answer is valid
-                                if new_answer != current_answer and new_answer in options:
-                                    # Swap the options to maintain validity
-                                    temp = options[current_answer]
-                                    options[current_answer] = options[new_answer]
-                                    options[new_answer] = temp
-                                    
-                                    q['correct_answer'] = new_answer
-                                    break
-                        
-                        # If we still couldn't find a valid swap, keep the original answer
-                        if new_answer == current_answer:
-                            q['correct_answer'] = current_answer
-                            continue
-                        
-
-
-            # Re-index questions to ensure unique sequential IDs
-            for idx, q in enumerate(generated_questions, start=1):
-                q['id'] = idx
+        translate = explanation_language.lower() != question_language.lower()
+
+        def publish_batch(batch: List[Dict[str, Any]]) -> None:
+            JOBS.append_questions(job_id, batch)
+            JOBS.append_event(job_id, "questions", {"total": JOBS.question_count(job_id), "questions": batch})
+
+        async def finalize_batch(batch: List[Dict[str, Any]], checkpointed: bool = False) -> None:
+            """Checkpoint an accepted batch, align and translate it, then expose it on the job right away."""
+            accepted = copy.deepcopy(batch)
+            if not checkpointed:
+                await asyncio.to_thread(checkpoint.accepted, accepted)
+            await bank_questions(accepted)
+            align_answers(batch)
+            if translate:
+                async with _span(job_id, "translate"):
+                    translated_explanations = await _translate_explanations(
+                        [q['explanation'] for q in batch], question_language, explanation_language, job_id
+                    )
+                for q, explanation in zip(batch, translated_explanations):
+                    q['explanation'] = explanation
+            await asyncio.to_thread(checkpoint.finalized, copy.deepcopy(batch))
+            await asyncio.to_thread(publish_batch, batch)
+
+        if resumed_pending:
+            finalizing.append(asyncio.create_task(finalize_batch(resumed_pending, checkpointed=True)))
+        if reused:
+            finalizing.append(asyncio.create_task(finalize_batch(reused)))
+
+        # Plan all batches up front and dispatch them concurrently, then top up only the shortfall
+        generate_started = time.perf_counter()
+        for round_no in range(MAX_TOPUP_ROUNDS):
+            shortfall = n_questions - len(generated_questions)
+            if shortfall <= 0:
+                break
+            # Largest batch that the learned tokens-per-question says will fit without truncation
+            batch_size, max_tokens = _batch_sizer.plan(MODEL, question_language, shortfall)
+            plan = []
+            for doc, (start, end) in enumerate(spans):
+                missing = quotas[doc] - doc_counts[doc]
+                if missing > 0:
+                    plan.extend((doc, start + chunk_index, size)
+                                for chunk_index, size in _plan_batches(missing, end - start, batch_size, round_no, topic_indexes[doc]))
+            plan = await within_budget(plan, max_tokens)
+            if not plan:
+                await update_job_status("in_progress", _generation_progress(len(generated_questions), n_questions), 2,
+                                  f"Token budget of {JOB_TOKEN_BUDGET} exhausted")
+                break
+            await update_job_status("in_progress", _generation_progress(len(generated_questions), n_questions), 2,
+                              f"Dispatching {len(plan)} batches of up to {batch_size} questions ({max_tokens} max tokens) for {shortfall} questions")
+
+            kept_by_doc = [0] * len(spans)
+            for finished in asyncio.as_completed([run_batch(doc, chunk_index, size, max_tokens) for doc, chunk_index, size in plan]):
+                doc, batch = await finished
+                kept = await accept_unique(doc, [q for q in batch if q is not None])
+                kept_by_doc[doc] += len(kept)
+                if kept:
+                    # Accepted questions get their final ids now and move through alignment/translation
+                    # while the remaining batches are still being generated
+                    for idx, q in enumerate(kept, start=len(generated_questions) - len(kept) + 1):
+                        q['id'] = idx
+                    finalizing.append(asyncio.create_task(finalize_batch(kept)))
+                    await publish_documents()
+                source = f"{doc_names[doc]}: " if documents is not None else ""
+                await update_job_status("in_progress", _generation_progress(len(generated_questions), n_questions), 2,
+                                  f"{source}Generated {len(kept)} unique questions, total: {len(generated_questions)}")
+
+            # A document that yielded nothing new this round is used up; the others make up its quota
+            for doc in sorted({doc for doc, _, _ in plan}):
+                if not kept_by_doc[doc] and doc_counts[doc] < quotas[doc] and reassign(doc):
+                    exhausted.add(doc)
+                    await update_job_status("in_progress", _generation_progress(len(generated_questions), n_questions), 2,
+                                      f"{doc_names[doc]}: no new questions, moved its remaining quota to the other documents")
+                    await publish_documents()
 
-            # Save to Excel if requested
-            if output_format == "excel":
-                update_job_status("in_progress", 98, 4, "Saving to Excel")
-                
-                # Create DataFrame
-                df = pd.DataFrame([
-                    {
-                        'ID': q['id'],
-                        'Question': q['question'],
-                        'Option A': q['options']['A'],
-                        'Option B': q['options']['B'],
-                        'Option C': q['options']['C'],
-                        'Option D': q['options']['D'],
-                        'Correct Answer': q['correct_answer'],
-                        'Explanation': q['explanation'],
-                        'Topic': q['topic']
-                    }
-                    for q in generated_questions
-                ])
-                
-                # Save to Excel
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"questions_{timestamp}.xlsx"
-                df.to_excel(filename, index=False)
-                update_job_status("in_progress", 99, 4, f"Saved to {filename}")
-
-            # Mark as completed
-            JOBS[job_id]["questions"] = generated_questions
-            JOBS[job_id]["topics"] = list(set(q["topic"] for q in generated_questions))
-            update_job_status("completed", 100, 4, "Question generation complete")
-            
-            # Log final statistics
-            update_job_status("completed", 100, 4, f"Generated {len(generated_questions)} questions")
-            update_job_status("completed", 100, 4, f"Found {len(JOBS[job_id]["topics"]) if JOBS[job_id]["topics"] else 0} unique topics")
+        await _add_stage_time(job_id, "generate", time.perf_counter() - generate_started)
 
+        # Ensure we have exactly the requested number of questions
+        if len(generated_questions) != n_questions:
+            # Let accepted batches finish so everything paid for is checkpointed for /resume
+            await asyncio.gather(*finalizing, return_exceptions=True)
+            raise ValueError(
+                f"Failed to generate exactly {n_questions} questions "
+                f"({len(generated_questions)} checkpointed; POST /jobs/{job_id}/resume to continue)"
+            )
+
+        if translate:
+            await update_job_status("in_progress", 85, 3, "Finishing explanation translations")
+        await asyncio.gather(*finalizing)
+        await update_job_status("in_progress", 96, 3, "Aligned correct answers and translated explanations")
+
+        # Even out correct-answer letters across the whole job with the fewest option swaps
+        moved = balance_answers(generated_questions)
+        if moved:
+            await update_job_status("in_progress", 97, 3, f"Balanced answer letters by moving {moved} answers: {answer_counts(generated_questions)}")
+
+        # Mark as completed; the final set (in id order, after rebalancing) replaces the streamed batches
+        # Topics go first: set_questions bumps questions_version, and a /questions read after
+        # that bump must not cache the old topics under the final ETag
+        topics = list(set(q["topic"] for q in generated_questions))
+        await asyncio.to_thread(JOBS.update, job_id, topics=topics)
+        await asyncio.to_thread(JOBS.set_questions, job_id, generated_questions)
+
+        # Build the Excel artifact up front if requested; it is served by /jobs/{job_id}/export
+        if output_format == "excel":
+            await update_job_status("in_progress", 98, 4, "Saving to Excel")
+            job = await asyncio.to_thread(JOBS.get, job_id, False, False)
+            async with _span(job_id, "export"):
+                await asyncio.to_thread(_export_job, job_id, "xlsx", job.get("questions_version", 0))
+            await update_job_status("in_progress", 99, 4, f"Saved to /jobs/{job_id}/export?format=xlsx")
+
+        await update_job_status("completed", 100, 4, "Question generation complete")
+        
+        # Log final statistics
+        await update_job_status("completed", 100, 4, f"Generated {len(generated_questions)} questions")
+        await update_job_status("completed", 100, 4, f"Found {len(topics)} unique topics")
+        await asyncio.to_thread(JOBS.append_event, job_id, "end", {"status": "completed"})
+        METRICS.inc("questgen_jobs_total", status="completed")
+
+    except asyncio.CancelledError:
+        # Stopped by a worker shutting down or losing its lease; the job is resumed elsewhere
+        for task in finalizing:
+            task.cancel()
+        raise
     except Exception as e:
         error_msg = f"Error in question generation: {str(e)}"
         print(f"Job {job_id}: ERROR: {error_msg}")
-        update_job_status("error", 100, 1, error_msg)
+        await asyncio.to_thread(JOBS.update, job_id, error=error_msg)
+        await update_job_status("error", 100, 1, error_msg)
+        await asyncio.to_thread(JOBS.append_event, job_id, "end", {"status": "error", "error": error_msg})
+        METRICS.inc("questgen_jobs_total", status="error")
         raise
 
+async def _load_document(job_id: str, save_path: Path, content_hash: str, text_path: Path, label: str = "") -> Tuple[str, List[str]]:
+    """Text and chunks of one uploaded document, extracted off the request path.
+
+    Repeat uploads of the same bytes reuse the cached text and chunks and skip extraction.
+    The text is also persisted to ``text_path`` so it's easily accessible later.
+    """
+    cached = await asyncio.to_thread(_extract_cache.get, content_hash)
+    if cached is not None:
+        raw_text, chunks = cached["text"], cached["chunks"]
+        await asyncio.to_thread(JOBS.append_log, job_id, f"{label}Reusing cached extraction for identical upload")
+        if cached.get("chunker") != _chunker_key():
+            # Same document, different chunk settings: re-split but still skip extraction
+            async with _span(job_id, "split"):
+                chunks = await asyncio.to_thread(_split_text, raw_text)
+            await asyncio.to_thread(_extract_cache.set, content_hash, {"text": raw_text, "chunks": chunks, "chunker": _chunker_key()})
+    elif text_path.exists():
+        # Resumed job whose extraction was evicted from the cache: reuse its saved text
+        await asyncio.to_thread(JOBS.append_log, job_id, f"{label}Reusing extracted text from the previous run")
+        raw_text = await asyncio.to_thread(text_path.read_text, encoding="utf-8")
+        async with _span(job_id, "split"):
+            chunks = await asyncio.to_thread(_split_text, raw_text)
+        await asyncio.to_thread(_extract_cache.set, content_hash, {"text": raw_text, "chunks": chunks, "chunker": _chunker_key()})
+    else:
+        await asyncio.to_thread(JOBS.append_log, job_id, f"{label}Extracting text")
+        async with _span(job_id, "extract"):
+            raw_text = await _extract_text_async(job_id, save_path)
+        async with _span(job_id, "split"):
+            chunks = await asyncio.to_thread(_split_text, raw_text)
+        await asyncio.to_thread(_extract_cache.set, content_hash, {"text": raw_text, "chunks": chunks, "chunker": _chunker_key()})
+    await asyncio.to_thread(text_path.write_text, raw_text, encoding="utf-8")
+    return raw_text, chunks
+
+def _fail_extraction(job_id: str, error_msg: str) -> None:
+    print(f"Job {job_id}: ERROR: {error_msg}")
+    JOBS.update(job_id, status="error", progress=100, error=error_msg)
+    JOBS.append_log(job_id, error_msg)
+    JOBS.append_event(job_id, "end", {"status": "error", "error": error_msg})
+    METRICS.inc("questgen_jobs_total", status="error")
+
+async def _process_upload(job_id: str, save_path: Path, content_hash: str, question_language: str, explanation_language: str, n_questions: int, output_format: str, question_bank: str = "reuse"):
+    """Job stage run after /upload returns: extract text off the request path, then generate."""
+    try:
+        # Persist raw text to backend/text/<job_id>.txt
+        raw_text, chunks = await _load_document(job_id, save_path, content_hash, TEXT_DIR / f"{job_id}.txt")
+    except Exception as exc:
+        await asyncio.to_thread(_fail_extraction, job_id, f"Failed to extract text: {exc}")
+        return
+
+    await asyncio.to_thread(JOBS.update, job_id, raw_text_length=len(raw_text))
+    await asyncio.to_thread(JOBS.append_log, job_id, f"Extracted {len(raw_text)} characters")
+    await _generate_async(job_id, raw_text, question_language, explanation_language, n_questions, output_format, chunks,
+                          content_hash=content_hash, question_bank=question_bank)
+
+async def _process_batch(job_id: str, documents: List[Dict[str, Any]], question_language: str, explanation_language: str, n_questions: int, output_format: str, question_bank: str = "reuse"):
+    """Job stage run after /upload/batch returns: extract every document in parallel, then generate once.
+
+    The documents' chunks form one shared pool. A document that fails to extract is
+    marked as such under the job's ``documents`` and left out of the pool.
+    """
+    records = [{"name": doc["name"], "content_hash": doc["content_hash"], "status": "extracting", "chunks": 0} for doc in documents]
+    # The store thread gets snapshots, so other documents' updates cannot change the records mid-write
+    await asyncio.to_thread(JOBS.update, job_id, documents=[dict(record) for record in records])
+
+    async def load(index: int, doc: Dict[str, Any]) -> Tuple[str, List[str]]:
+        label = f"{doc['name']}: "
+        try:
+            # Persist raw text to backend/text/<job_id>.<index>.txt
+            raw_text, chunks = await _load_document(job_id, Path(doc["save_path"]), doc["content_hash"], TEXT_DIR / f"{job_id}.{index}.txt", label)
+        except Exception as exc:
+            records[index].update(status="error", error=f"Failed to extract text: {exc}")
+            await asyncio.to_thread(JOBS.update, job_id, documents=[dict(record) for record in records])
+            await asyncio.to_thread(JOBS.append_log, job_id, f"{label}Failed to extract text: {exc}")
+            return "", []
+        records[index].update(status="extracted" if chunks else "empty", chunks=len(chunks))
+        await asyncio.to_thread(JOBS.update, job_id, documents=[dict(record) for record in records])
+        await asyncio.to_thread(JOBS.append_log, job_id, f"{label}Extracted {len(raw_text)} characters")
+        return raw_text, chunks
+
+    loaded = await asyncio.gather(*(load(index, doc) for index, doc in enumerate(documents)))
+    usable = sum(1 for _, chunks in loaded if chunks)
+    if not usable:
+        await asyncio.to_thread(_fail_extraction, job_id, "Failed to extract text from any of the uploaded documents")
+        return
+
+    raw_text = "\n\n".join(text for text, _ in loaded if text)
+    await asyncio.to_thread(JOBS.update, job_id, raw_text_length=len(raw_text))
+    await asyncio.to_thread(JOBS.append_log, job_id, f"Extracted {len(raw_text)} characters from {usable} of {len(documents)} documents")
+    chunks = [chunk for _, doc_chunks in loaded for chunk in doc_chunks]
+    await _generate_async(job_id, raw_text, question_language, explanation_language, n_questions, output_format, chunks, records,
+                          question_bank=question_bank)
+
+async def _run_job(job_id: str, params: Dict[str, Any]) -> None:
+    """Run a scheduled job from its parameters: a single /upload or an /upload/batch job."""
+    options = (params["question_language"], params["explanation_language"], params["n_questions"], params["output_format"],
+               params.get("question_bank", "reuse"))
+    if "documents" in params:
+        await _process_batch(job_id, params["documents"], *options)
+    else:
+        await _process_upload(job_id, Path(params["save_path"]), params["content_hash"], *options)
+
+async def _heartbeat(job_id: str) -> None:
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        # An update with no fields only bumps updated_at
+        await asyncio.to_thread(JOBS.update, job_id)
+
+async def _run_inline(job_id: str, params: Dict[str, Any]) -> None:
+    """Background task of inline mode: wait for a free slot, then run the job.
+
+    The job record is touched every JOB_HEARTBEAT_SECONDS meanwhile, so a job left
+    in_progress by a web process that died shows up as stale (see _is_orphaned).
+    """
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        async with ADMISSION.slot(job_id):
+            await _run_job(job_id, params)
+    finally:
+        heartbeat.cancel()
+
+def _is_orphaned(job_id: str, job: Dict[str, Any]) -> bool:
+    """True for an in_progress job that nothing is running any more, e.g. its web process restarted mid-job."""
+    if job["status"] != "in_progress" or time.time() - job.get("updated_at", 0) < JOB_STALE_SECONDS:
+        return False
+    return QUEUE is None or not QUEUE.active(job_id)
+
+async def _schedule_job(job_id: str, params: Dict[str, Any], background_tasks: BackgroundTasks, client: str) -> None:
+    """Run the job's stages as a background task, or hand them to a worker in queue mode.
+
+    Either way the job waits its turn in a line shared fairly between clients.
+    """
+    if QUEUE is not None:
+        # Picked up by a worker.py process; see _run_job for the stages it runs
+        await asyncio.to_thread(QUEUE.enqueue, job_id, params, client)
+        await asyncio.to_thread(JOBS.append_log, job_id, "Queued for a worker")
+        return
+    ADMISSION.enqueue(job_id, client)
+    position = ADMISSION.position(job_id)
+    if position is not None:
+        await asyncio.to_thread(JOBS.append_log, job_id, f"Waiting for a free slot, {position} job(s) ahead")
+    background_tasks.add_task(_run_inline, job_id, params)
+
+def _too_large(name: str, max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"{name} exceeds the {describe_bytes(max_bytes)} limit")
+
+def _too_many_documents() -> HTTPException:
+    return HTTPException(status_code=400, detail=f"At most {BATCH_MAX_DOCUMENTS} documents per batch")
+
+async def _save_upload(file: UploadFile, save_path: Path, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """Stream an upload to disk in chunks instead of buffering it in memory. Returns its SHA-256.
+
+    Stops with 413 as soon as more than ``max_bytes`` have arrived.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with save_path.open("wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    break
+                hasher.update(chunk)
+                buffer.write(chunk)
+    except Exception as exc:
+        save_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Failed to save upload: {exc}")
+    if size > max_bytes:
+        save_path.unlink(missing_ok=True)
+        raise _too_large(Path(file.filename or "upload").name, max_bytes)
+    return hasher.hexdigest()
+
+def _unpack_zip(zip_path: Path, dest_dir: Path, first_index: int, max_total_bytes: int,
+                max_documents: int) -> List[Tuple[str, Path, str]]:
+    """Copy the PDF/DOCX members of a zip into dest_dir. Returns (name, path, sha256) per document.
+
+    Members over MAX_UPLOAD_BYTES, or more than ``max_total_bytes`` unpacked in all, fail with 413;
+    a member past the first ``max_documents``, or an encrypted one, fails with 400 before any of it is written.
+    Sizes are counted as bytes are written, not taken from the archive's own (forgeable) headers.
+    """
+    unpacked = []
+    total = 0
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.infolist():
+            # Keep only the base name so members cannot be written outside dest_dir
+            name = Path(member.filename.replace("\\", "/")).name
+            if member.is_dir() or name.startswith(".") or Path(name).suffix.lower() not in DOCUMENT_SUFFIXES:
+                continue
+            if len(unpacked) >= max_documents:
+                raise _too_many_documents()
+            if member.flag_bits & 0x1:
+                raise HTTPException(status_code=400, detail=f"{name} is encrypted; upload documents without a password")
+            path = dest_dir / f"{first_index + len(unpacked):03d}_{name}"
+            hasher = hashlib.sha256()
+            size = 0
+            with archive.open(member) as src, path.open("wb") as dst:
+                while chunk := src.read(UPLOAD_CHUNK_BYTES):
+                    size += len(chunk)
+                    total += len(chunk)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise _too_large(name, MAX_UPLOAD_BYTES)
+                    if total > max_total_bytes:
+                        raise _too_large("Unzipped upload", max_total_bytes)
+                    hasher.update(chunk)
+                    dst.write(chunk)
+            unpacked.append((name, path, hasher.hexdigest()))
+    return unpacked
+
+def _unique_name(name: str, taken: set) -> str:
+    """``name``, or ``stem (2).ext`` etc. if another document of the job already uses it."""
+    candidate, n = name, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{Path(name).stem} ({n}){Path(name).suffix}"
+    taken.add(candidate)
+    return candidate
+
 @app.post("/upload")
 async def upload_document(
+    request: Request,
     background_tasks: BackgroundTasks,
     file: UploadFile,
     question_language: str = Form(...),
     explanation_language: str = Form(...),
     number_of_questions: str = Form(...),
     output_format: str = Form(...),
+    question_bank: str = Form("reuse"),
 ):
-    """Receive a document and metadata, return a job id after text extraction."""
-    # Persist file to disk
+    """Receive a document and metadata, return a job id immediately; extraction runs as a job stage."""
+    suffix = Path(file.filename or "").suffix.lower()
+    if suffix not in DOCUMENT_SUFFIXES:
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    try:
+        n_questions = int(number_of_questions)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="number_of_questions must be an integer")
+    if question_bank not in QUESTION_BANK_MODES:
+        raise HTTPException(status_code=400, detail=f"question_bank must be one of {', '.join(QUESTION_BANK_MODES)}")
+    # Checked again now the body is in: other uploads may have taken the room while it arrived
+    client = await _admit_request(request)
+
     job_id = str(uuid.uuid4())
-    save_path = UPLOAD_DIR / f"{job_id}_{file.filename}"
-    with save_path.open("wb") as buffer:
-        buffer.write(await file.read())
+    save_path = UPLOAD_DIR / f"{job_id}_{Path(file.filename).name}"
+    content_hash = await _save_upload(file, save_path)
+
+    text_path = TEXT_DIR / f"{job_id}.txt"
+    await asyncio.to_thread(JOBS.create, job_id, {
+        "status": "in_progress",
+        "progress": 0,
+        "step": 1,
+        "topics": [],
+        "pages_done": 0,
+        "pages_total": 0,
+        "content_hash": content_hash,
+        "start_time": time.time(),
+        "done": False,
+    })
+    await asyncio.to_thread(JOBS.append_log, job_id, "File received")
 
-    # Extract raw text (sync for now; for large files consider background task)
+    # Everything needed to run (or later resume) the job; also the queue payload
+    params = {
+        "save_path": str(save_path),
+        "content_hash": content_hash,
+        "question_language": question_language,
+        "explanation_language": explanation_language,
+        "n_questions": n_questions,
+        "output_format": output_format,
+        "question_bank": question_bank,
+    }
+    await asyncio.to_thread(_checkpoint(job_id).start, params)
+    await _schedule_job(job_id, params, background_tasks, client)
+
+    return JSONResponse(
+        {
+            "job_id": job_id,
+            "text_file": str(text_path.relative_to(BASE_DIR)),
+            "message": "File received and processing started",
+        }
+    )
+
+
+@app.post("/upload/batch")
+async def upload_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile],
+    question_language: str = Form(...),
+    explanation_language: str = Form(...),
+    number_of_questions: str = Form(...),
+    output_format: str = Form(...),
+    question_bank: str = Form("reuse"),
+):
+    """Receive many documents (PDF/DOCX files and/or zips of them) as one job.
+
+    Text is extracted from every document in parallel and generation draws on one shared
+    chunk pool, each document getting a share of number_of_questions in proportion to its
+    length. Per-document progress is reported under ``documents`` by /jobs/{job_id}.
+    """
+    for file in files:
+        if Path(file.filename or "").suffix.lower() not in DOCUMENT_SUFFIXES + (".zip",):
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.filename}")
     try:
-        raw_text = _extract_text(save_path)
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to extract text: {exc}")
+        n_questions = int(number_of_questions)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="number_of_questions must be an integer")
+    if question_bank not in QUESTION_BANK_MODES:
+        raise HTTPException(status_code=400, detail=f"question_bank must be one of {', '.join(QUESTION_BANK_MODES)}")
+    # Checked again now the body is in: other uploads may have taken the room while it arrived
+    client = await _admit_request(request)
 
-    # Persist raw text to backend/uploads/<job_id>.txt so it's easily accessible later
-    text_path = TEXT_DIR / f"{job_id}.txt"
+    job_id = str(uuid.uuid4())
+    job_dir = UPLOAD_DIR / job_id
+    job_dir.mkdir(parents=True)
+    documents: List[Dict[str, Any]] = []
+    names: set = set()
     try:
-        text_path.write_text(raw_text, encoding="utf-8")
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to save extracted text: {exc}")
+        for file in files:
+            name = Path(file.filename).name
+            if name.lower().endswith(".zip"):
+                zip_path = job_dir / f"upload-{uuid.uuid4().hex}.zip"
+                await _save_upload(file, zip_path, BATCH_MAX_UPLOAD_BYTES)
+                try:
+                    unpacked = await asyncio.to_thread(_unpack_zip, zip_path, job_dir, len(documents), BATCH_MAX_UPLOAD_BYTES,
+                                                       BATCH_MAX_DOCUMENTS - len(documents))
+                except zipfile.BadZipFile:
+                    raise HTTPException(status_code=400, detail=f"{name} is not a valid zip archive")
+                except (NotImplementedError, zlib.error) as exc:
+                    # Compression methods zipfile cannot read, or member data that fails to decompress
+                    raise HTTPException(status_code=400, detail=f"{name} cannot be unpacked: {exc}")
+                finally:
+                    zip_path.unlink(missing_ok=True)
+            else:
+                if len(documents) >= BATCH_MAX_DOCUMENTS:
+                    raise _too_many_documents()
+                save_path = job_dir / f"{len(documents):03d}_{name}"
+                unpacked = [(name, save_path, await _save_upload(file, save_path))]
+            for doc_name, save_path, content_hash in unpacked:
+                documents.append({"name": _unique_name(doc_name, names), "save_path": str(save_path), "content_hash": content_hash})
+        if not documents:
+            raise HTTPException(status_code=400, detail="No PDF or DOCX documents in the upload")
+    except BaseException:
+        # Whatever went wrong (or the client went away), leave no half-unpacked upload behind
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
 
-    JOBS[job_id] = {
+    await asyncio.to_thread(JOBS.create, job_id, {
+        "status": "in_progress",
+        "progress": 0,
         "step": 1,
-        "progress": 20,
+        "topics": [],
+        "pages_done": 0,
+        "pages_total": 0,
+        "documents": [{"name": doc["name"], "content_hash": doc["content_hash"], "status": "queued", "chunks": 0} for doc in documents],
+        "start_time": time.time(),
         "done": False,
-    }
+    })
+    await asyncio.to_thread(JOBS.append_log, job_id, f"Received {len(documents)} documents")
 
-    background_tasks.add_task(
-        _generate_async,
-        job_id,
-        raw_text,
-        question_language,
-        explanation_language,
-        int(number_of_questions),
-        output_format,
-    )
+    # Everything needed to run (or later resume) the job; also the queue payload
+    params = {
+        "documents": documents,
+        "question_language": question_language,
+        "explanation_language": explanation_language,
+        "n_questions": n_questions,
+        "output_format": output_format,
+        "question_bank": question_bank,
+    }
+    await asyncio.to_thread(_checkpoint(job_id).start, params)
+    await _schedule_job(job_id, params, background_tasks, client)
 
     return JSONResponse(
         {
             "job_id": job_id,
-            "raw_text_length": len(raw_text),
-            "text_file": str(text_path.relative_to(Path(__file__).resolve().parent)),
-            "message": "File received and processing started",
+            "documents": [doc["name"] for doc in documents],
+            "message": f"{len(documents)} documents received and processing started",
         }
     )
 
 
 @app.get("/jobs/{job_id}")
-async def get_job_status(job_id: str):
-    """Get the status of a job."""
-    try:
-        if job_id not in JOBS:
-            raise HTTPException(status_code=404, detail="Job not found")
-        
-        job = JOBS[job_id]
-        
-        # Calculate ETA (estimated time remaining)
-        if job["status"] == "in_progress":
-            current_time = time.time()
-            start_time = job.get("start_time", current_time)
-            elapsed_time = current_time - start_time
-            progress = job["progress"] / 100
-            if progress > 0:
-                total_time = elapsed_time / progress
-                remaining_time = total_time * (1 - progress)
-                eta = int(remaining_time)
-            else:
-                eta = 0
+async def get_job_status(job_id: str, log_cursor: Optional[int] = None, log_limit: int = Query(50, ge=1, le=500)):
+    """Get the status of a job.
+
+    Only progress and counters are returned; questions are served by /jobs/{job_id}/questions.
+    Pass the returned log_cursor back to receive only log lines added since the last poll;
+    without it the last log_limit lines are returned.
+    """
+    job = await asyncio.to_thread(JOBS.get, job_id, False, False)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    def read_details():
+        if log_cursor is None:
+            log_lines = JOBS.tail_logs(job_id, log_limit)
         else:
-            eta = 0
-        
+            log_lines = JOBS.logs(job_id, after=log_cursor, limit=log_limit)
+        return log_lines, JOBS.question_count(job_id), JOBS.questions(job_id, limit=3)
+
+    try:
+        eta = _estimate_eta(job)
+        queue_position, queue_wait = await _queue_status(job_id)
+        if queue_position is not None:
+            # Not started yet: the wait for a slot plus a typical run
+            eta = queue_wait + int(ADMISSION.job_seconds)
+
+        log_lines, questions_generated, preview = await asyncio.to_thread(read_details)
+
         # Prepare response with all required fields
         response = {
             "status": job["status"],
             "progress": job["progress"],
             "step": job["step"],
-            "logs": job["logs"],
-            "questions_generated": len(job.get("questions", [])),
+            "logs": [message for _, message in log_lines],
+            "log_cursor": log_lines[-1][0] if log_lines else (log_cursor or 0),
+            "pages_done": job.get("pages_done", 0),
+            "pages_total": job.get("pages_total", 0),
+            "questions_generated": questions_generated,
             "topics_detected": len(job.get("topics", [])),
-            "questions_preview": job.get("questions", [])[:3],  # Show first 3 questions as preview
+            "documents": job.get("documents", []),
+            "parse_failures": job.get("parse_failures", 0),
+            "wasted_tokens": job.get("wasted_tokens", 0),
+            "timings": {stage: round(job.get(f"{stage}_seconds", 0.0), 3) for stage in STAGES},
+            "usage": {
+                field: job.get(field, 0)
+                for field in ("llm_requests", "llm_cached", "llm_retries", "prompt_tokens", "completion_tokens", "duplicates_dropped", "bank_reused")
+            },
+            "questions_preview": preview,  # Show first 3 questions as preview
             "eta": eta,
+            "queue_position": queue_position,
+            "queue_wait_seconds": queue_wait,
             "error": job.get("error", None) if job["status"] == "error" else None,
-            "questions": job.get("questions", []),  # Include all questions for download
-            "topics": job.get("topics", [])
         }
         
-        return response   
-        return job
+        return response
     except Exception as e:
         print(f"Error getting job status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str, request: Request, background_tasks: BackgroundTasks):
+    """Continue a failed job from its checkpoint, generating only the questions still missing.
+
+    Jobs left in_progress by a process that died (see _is_orphaned) can be resumed too.
+    Works until the job expires: TTL eviction deletes the checkpoint and text along with the record.
+    ``last_event_id`` can be passed to /jobs/{job_id}/events to follow only the resumed run.
+    """
+    checkpoint = _checkpoint(job_id)
+    params, finalized, pending = await asyncio.to_thread(checkpoint.load)
+    if params is None:
+        raise HTTPException(status_code=404, detail="No checkpoint for this job")
+
+    job = await asyncio.to_thread(JOBS.get, job_id, False, False)
+    if job is not None and job["status"] != "error" and not await asyncio.to_thread(_is_orphaned, job_id, job):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; only failed or orphaned jobs can be resumed")
+    client = await _admit_request(request)
+    if job is None:
+        await asyncio.to_thread(JOBS.create, job_id, {
+            "status": "in_progress",
+            "progress": 0,
+            "step": 1,
+            "topics": [],
+            "pages_done": 0,
+            "pages_total": 0,
+            "content_hash": params.get("content_hash"),
+            "start_time": time.time(),
+            "done": False,
+        })
+
+    checkpointed = len(finalized) + len(pending)
+    missing = max(params["n_questions"] - checkpointed, 0)
+    # The failed run's events stay in the stream; /events skips its "end" from this event on
+    run_started_event = await asyncio.to_thread(
+        JOBS.append_log, job_id, f"Resuming: {checkpointed} questions checkpointed, {missing} still to generate"
+    )
+    await asyncio.to_thread(JOBS.update, job_id, status="in_progress", progress=0, step=1, error=None, pages_done=0, pages_total=0,
+                            start_time=time.time(), run_started_event=run_started_event)
+    await _schedule_job(job_id, params, background_tasks, client)
+    return {"job_id": job_id, "checkpointed": checkpointed, "missing": missing, "last_event_id": run_started_event, "message": "Job resumed"}
+
+
+@app.get("/jobs/{job_id}/questions")
+async def get_job_questions(
+    job_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Page through a job's questions. Unchanged pages answer If-None-Match with 304."""
+    job = await asyncio.to_thread(JOBS.get, job_id, False, False)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    etag = f'W/"{job_id}-{job.get("questions_version", 0)}-{offset}-{limit}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    total = await asyncio.to_thread(JOBS.question_count, job_id)
+    questions = await asyncio.to_thread(JOBS.questions, job_id, offset, limit)
+    return JSONResponse(
+        {
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "questions": questions,
+            "topics": job.get("topics", []),
+        },
+        headers={"ETag": etag},
+    )
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request, last_event_id: int = Query(0, ge=0)):
+    """Server-Sent Events stream of a job's progress, log and question-batch events.
+
+    Reconnecting clients resume after the Last-Event-ID header (or ?last_event_id=).
+    The stream closes after the job's "end" event; "end" events of runs that were
+    later resumed are skipped.
+    """
+    if not await asyncio.to_thread(JOBS.exists, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    header = request.headers.get("last-event-id", "")
+    cursor = int(header) if header.isdigit() else last_event_id
+
+    async def event_stream():
+        nonlocal cursor
+        wake = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wake)
+        _event_waiters.setdefault(job_id, []).append(waiter)
+        try:
+            idle = 0.0
+            while not await request.is_disconnected():
+                wake.clear()
+                events = await asyncio.to_thread(JOBS.events, job_id, cursor, 500)
+                for event_id, kind, data in events:
+                    cursor = event_id
+                    if kind == "end":
+                        job = await asyncio.to_thread(JOBS.get, job_id, False, False)
+                        if job is not None and event_id < job.get("run_started_event", 0):
+                            continue  # an earlier run that failed and was resumed
+                    yield f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+                    if kind == "end":
+                        return
+                if events:
+                    idle = 0.0
+                    continue
+                job = await asyncio.to_thread(JOBS.get, job_id, False, False)
+                if job is None or (job["status"] in FINISHED_STATUSES and time.time() - job.get("updated_at", 0) > SSE_POLL_SECONDS):
+                    # Finished without an end event (e.g. the worker died) or already evicted
+                    yield f"event: end\ndata: {json.dumps({'status': job['status'] if job else 'expired'})}\n\n"
+                    return
+                try:
+                    await asyncio.wait_for(wake.wait(), SSE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    idle += SSE_POLL_SECONDS
+                    if idle >= SSE_KEEPALIVE_SECONDS:
+                        idle = 0.0
+                        yield ": keepalive\n\n"
+        finally:
+            waiters = _event_waiters.get(job_id, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                _event_waiters.pop(job_id, None)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/export")
+async def export_job(job_id: str, format: str = Query("xlsx", pattern="^(xlsx|csv|jsonl)$")):
+    """Download a job's questions as xlsx, csv or jsonl.
+
+    Rows are streamed from the job store into the file, and the artifact is cached per job
+    until its questions change.
+    """
+    job = await asyncio.to_thread(JOBS.get, job_id, False, False)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        async with _span(job_id, "export"):
+            path = await asyncio.to_thread(_export_job, job_id, format, job.get("questions_version", 0))
+    except Exception as e:
+        print(f"Error exporting job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to export questions: {e}")
+    return FileResponse(path, media_type=EXPORT_MEDIA_TYPES[format], filename=f"questions_{job_id}.{format}")
+
+
+@app.get("/questions")
+async def search_question_bank(
+    q: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    language: Optional[str] = None,
+    topic: Optional[str] = None,
+    chunk: Optional[int] = Query(None, ge=0),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Search the question bank across all jobs.
+
+    ``q`` is matched word by word against questions, explanations and topics, best match
+    first; the other parameters filter by source document (its SHA-256, as reported in
+    job records), question language, topic and chunk index.
+    """
+    if BANK is None:
+        raise HTTPException(status_code=404, detail="The question bank is disabled")
+    questions = await asyncio.to_thread(BANK.search, q, content_hash, language, topic, chunk, offset, limit)
+    return {"questions": questions, "offset": offset, "limit": limit}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint for this server process."""
+    return Response(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
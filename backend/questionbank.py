@@ -0,0 +1,182 @@
+import json
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from jobstore import SQLiteDatabase
+
+# Fields kept in a bank entry; ids, document names and other job-specific fields are not
+_QUESTION_FIELDS = ("question", "options", "correct_answer", "explanation", "topic")
+
+
+class QuestionBank:
+    """Questions kept across jobs, keyed by the SHA-256 of the source document.
+
+    Entries are stored in the question language before alignment and
+    translation, together with the chunk they were generated from and their
+    topic, so a later job on the same document can reuse them and dedupe new
+    questions against them. ``uses`` counts how often an entry was handed to a
+    job, and ``entries`` lists the least used first.
+    """
+
+    def add(self, content_hash: str, language: str, questions: Iterable[Dict[str, Any]], job_id: Optional[str] = None) -> int:
+        """Store questions not already in the bank for this document and language. Returns how many were new."""
+        raise NotImplementedError
+
+    def entries(self, content_hash: str, language: str) -> List[Tuple[int, Dict[str, Any]]]:
+        """Return ``(entry_id, question)`` pairs for a document, least used first."""
+        raise NotImplementedError
+
+    def mark_used(self, entry_ids: Iterable[int]) -> None:
+        raise NotImplementedError
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        language: Optional[str] = None,
+        topic: Optional[str] = None,
+        chunk: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """Full-text search over questions, explanations and topics, best match first.
+
+        Without a query, entries matching the filters are listed oldest first.
+        """
+        raise NotImplementedError
+
+
+class SQLiteQuestionBank(QuestionBank):
+    """Bank kept in a SQLite file, with an FTS5 index when the SQLite build has it.
+
+    Without FTS5, search falls back to matching every query word with LIKE.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._db = SQLiteDatabase(self.path)
+        with self._db.connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS bank_questions (
+                    id INTEGER PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    chunk INTEGER,
+                    topic TEXT,
+                    question TEXT NOT NULL,
+                    explanation TEXT,
+                    data TEXT NOT NULL,
+                    job_id TEXT,
+                    uses INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    UNIQUE (content_hash, language, question)
+                );
+                CREATE INDEX IF NOT EXISTS bank_questions_chunk ON bank_questions (content_hash, chunk);
+                CREATE INDEX IF NOT EXISTS bank_questions_topic ON bank_questions (content_hash, topic);
+                """
+            )
+            try:
+                conn.executescript(
+                    """
+                    CREATE VIRTUAL TABLE IF NOT EXISTS bank_fts USING fts5(
+                        question, explanation, topic, content='bank_questions', content_rowid='id'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS bank_questions_fts AFTER INSERT ON bank_questions BEGIN
+                        INSERT INTO bank_fts (rowid, question, explanation, topic)
+                        VALUES (new.id, new.question, new.explanation, new.topic);
+                    END;
+                    """
+                )
+                self.full_text = True
+            except sqlite3.OperationalError:  # SQLite built without FTS5
+                self.full_text = False
+
+    def add(self, content_hash: str, language: str, questions: Iterable[Dict[str, Any]], job_id: Optional[str] = None) -> int:
+        now = time.time()
+        rows = [
+            (
+                content_hash,
+                language,
+                q.get("chunk"),
+                q.get("topic"),
+                q["question"],
+                q.get("explanation"),
+                json.dumps({field: q[field] for field in _QUESTION_FIELDS if field in q}, ensure_ascii=False),
+                job_id,
+                now,
+            )
+            for q in questions
+        ]
+        with self._db.write() as conn:
+            return conn.executemany(
+                "INSERT OR IGNORE INTO bank_questions "
+                "(content_hash, language, chunk, topic, question, explanation, data, job_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            ).rowcount
+
+    @staticmethod
+    def _question(data: str, chunk: Optional[int]) -> Dict[str, Any]:
+        q = json.loads(data)
+        q["chunk"] = chunk
+        return q
+
+    def entries(self, content_hash: str, language: str) -> List[Tuple[int, Dict[str, Any]]]:
+        rows = self._db.connect().execute(
+            "SELECT id, data, chunk FROM bank_questions WHERE content_hash = ? AND language = ? ORDER BY uses, id",
+            (content_hash, language),
+        ).fetchall()
+        return [(entry_id, self._question(data, chunk)) for entry_id, data, chunk in rows]
+
+    def mark_used(self, entry_ids: Iterable[int]) -> None:
+        with self._db.write() as conn:
+            conn.executemany("UPDATE bank_questions SET uses = uses + 1 WHERE id = ?", ((entry_id,) for entry_id in entry_ids))
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        language: Optional[str] = None,
+        topic: Optional[str] = None,
+        chunk: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        where, args = [], []
+        for column, value in (("content_hash", content_hash), ("language", language), ("topic", topic), ("chunk", chunk)):
+            if value is not None:
+                where.append(f"b.{column} = ?")
+                args.append(value)
+        # Quote each word so user input is never parsed as FTS query syntax
+        words = re.findall(r"\w+", query or "")
+        if words and self.full_text:
+            sql = "SELECT b.id, b.content_hash, b.language, b.chunk, b.uses, b.created_at, b.data FROM bank_fts " \
+                  "JOIN bank_questions b ON b.id = bank_fts.rowid WHERE bank_fts MATCH ?"
+            args.insert(0, " ".join(f'"{word}"' for word in words))
+            order = "bank_fts.rank"
+        else:
+            sql = "SELECT b.id, b.content_hash, b.language, b.chunk, b.uses, b.created_at, b.data FROM bank_questions b WHERE 1 = 1"
+            for word in words:
+                where.append("(b.question LIKE ? OR b.explanation LIKE ? OR b.topic LIKE ?)")
+                args.extend([f"%{word}%"] * 3)
+            order = "b.id"
+        sql += "".join(f" AND {clause}" for clause in where) + f" ORDER BY {order} LIMIT ? OFFSET ?"
+        rows = self._db.connect().execute(sql, (*args, limit, offset)).fetchall()
+        results = []
+        for entry_id, entry_hash, entry_language, entry_chunk, uses, created_at, data in rows:
+            q = self._question(data, entry_chunk)
+            q.update(bank_id=entry_id, content_hash=entry_hash, language=entry_language, uses=uses, created_at=created_at)
+            results.append(q)
+        return results
+
+
+def open_question_bank(backend: str, path: Path) -> Optional[QuestionBank]:
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        return SQLiteQuestionBank(path)
+    raise ValueError(f"Unknown question bank backend: {backend}")
@@ -0,0 +1,246 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from jobstore import SQLiteDatabase
+
+
+class Task(NamedTuple):
+    job_id: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class TaskQueue:
+    """Durable queue of job tasks handed out to worker processes under leases.
+
+    ``claim`` gives a runnable task to one worker for ``lease_seconds``; the
+    worker keeps it by calling ``heartbeat`` before the lease runs out. A task
+    whose lease expires (the worker crashed or was killed) becomes claimable
+    again, and is reclaimed before anything new, up to ``max_attempts``
+    claims, after which ``reap`` reports it as abandoned. Queued tasks are
+    handed out round-robin across the clients that enqueued them, oldest
+    first within each client.
+    """
+
+    def __init__(self, max_attempts: int = 3):
+        self.max_attempts = max_attempts
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any], client: str = "") -> None:
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Task]:
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend the lease. Returns False if the worker no longer holds the task."""
+        raise NotImplementedError
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        """Hand a task back without counting the attempt, e.g. on graceful shutdown."""
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker_id: str) -> None:
+        raise NotImplementedError
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        raise NotImplementedError
+
+    def reap(self) -> List[str]:
+        """Mark tasks whose lease expired on their last attempt as failed and return their job ids."""
+        raise NotImplementedError
+
+    def active(self, job_id: str) -> bool:
+        """True if the task is queued, leased to a worker, or will be reclaimed once its lease runs out."""
+        raise NotImplementedError
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Number of queued tasks that will be claimed before ``job_id``, or None if it is not waiting."""
+        raise NotImplementedError
+
+    def backlog(self, client: str) -> Tuple[int, int, int]:
+        """``(queued, running, queued for client)`` task counts."""
+        raise NotImplementedError
+
+    def average_seconds(self, recent: int = 50) -> Optional[float]:
+        """Mean run time of the most recently completed tasks, or None before any completed."""
+        raise NotImplementedError
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """Queue kept in a ``job_tasks`` table, normally in the job store's database file.
+
+    Claims run inside ``BEGIN IMMEDIATE`` transactions, so any number of
+    worker processes can poll the same file without handing a task out twice.
+    """
+
+    def __init__(self, path: Path, max_attempts: int = 3):
+        super().__init__(max_attempts)
+        self.path = Path(path)
+        self._db = SQLiteDatabase(self.path)
+        with self._db.connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS job_tasks (
+                    job_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    enqueued_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS job_tasks_status ON job_tasks (status, enqueued_at);
+                """
+            )
+            # Columns added after the table was first released
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(job_tasks)")}
+            for column, ddl in (("client", "TEXT NOT NULL DEFAULT ''"), ("started_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE job_tasks ADD COLUMN {column} {ddl}")
+            conn.execute("CREATE INDEX IF NOT EXISTS job_tasks_client ON job_tasks (client, started_at)")
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any], client: str = "") -> None:
+        now = time.time()
+        with self._db.write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_tasks (job_id, payload, status, attempts, client, enqueued_at, updated_at) "
+                "VALUES (?, ?, 'queued', 0, ?, ?, ?)",
+                (job_id, json.dumps(payload), client, now, now),
+            )
+
+    def _rotation(self, conn: sqlite3.Connection) -> List[List[str]]:
+        """Queued job ids per client, oldest first, with clients in the order they are next served.
+
+        The client served least recently (or never) comes first, so claiming its
+        oldest task and repeating visits clients round-robin.
+        """
+        lines: Dict[str, List[str]] = {}
+        for client, job_id in conn.execute(
+            "SELECT client, job_id FROM job_tasks WHERE status = 'queued' AND attempts < ? ORDER BY enqueued_at",
+            (self.max_attempts,),
+        ):
+            lines.setdefault(client, []).append(job_id)
+        served = dict(conn.execute(
+            "SELECT client, MAX(started_at) FROM job_tasks "
+            "WHERE client IN (SELECT client FROM job_tasks WHERE status = 'queued') GROUP BY client"
+        ).fetchall())
+        # sorted() is stable, so ties keep the order of each client's oldest task
+        order = sorted(lines, key=lambda client: served.get(client) or 0.0)
+        return [lines[client] for client in order]
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Task]:
+        now = time.time()
+        # Idle workers poll constantly; a plain read finds most polls have nothing to claim without
+        # taking the write lock the API needs
+        if self._db.connect().execute(
+            "SELECT 1 FROM job_tasks WHERE status = 'queued' OR (status = 'running' AND lease_expires < ? AND attempts < ?) LIMIT 1",
+            (now, self.max_attempts),
+        ).fetchone() is None:
+            return None
+        with self._db.write() as conn:
+            # Tasks whose worker died were started first, so they go ahead of the queue
+            row = conn.execute(
+                "SELECT job_id FROM job_tasks WHERE status = 'running' AND lease_expires < ? AND attempts < ? "
+                "ORDER BY enqueued_at LIMIT 1",
+                (now, self.max_attempts),
+            ).fetchone()
+            if row is None:
+                rotation = self._rotation(conn)
+                if not rotation:
+                    return None
+                row = (rotation[0][0],)
+            job_id, payload, attempts = conn.execute(
+                "SELECT job_id, payload, attempts FROM job_tasks WHERE job_id = ?", row
+            ).fetchone()
+            conn.execute(
+                "UPDATE job_tasks SET status = 'running', worker = ?, lease_expires = ?, attempts = ?, "
+                "started_at = ?, updated_at = ? WHERE job_id = ?",
+                (worker_id, now + lease_seconds, attempts + 1, now, now, job_id),
+            )
+        return Task(job_id, json.loads(payload), attempts + 1)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        now = time.time()
+        with self._db.write() as conn:
+            updated = conn.execute(
+                "UPDATE job_tasks SET lease_expires = ?, updated_at = ? WHERE job_id = ? AND worker = ? AND status = 'running'",
+                (now + lease_seconds, now, job_id, worker_id),
+            ).rowcount
+        return updated == 1
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        with self._db.write() as conn:
+            conn.execute(
+                "UPDATE job_tasks SET status = 'queued', worker = NULL, lease_expires = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE job_id = ? AND worker = ? AND status = 'running'",
+                (time.time(), job_id, worker_id),
+            )
+
+    def _finish(self, job_id: str, worker_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._db.write() as conn:
+            conn.execute(
+                "UPDATE job_tasks SET status = ?, error = ?, lease_expires = NULL, updated_at = ? WHERE job_id = ? AND worker = ?",
+                (status, error, time.time(), job_id, worker_id),
+            )
+
+    def complete(self, job_id: str, worker_id: str) -> None:
+        self._finish(job_id, worker_id, "done")
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        self._finish(job_id, worker_id, "failed", error)
+
+    def reap(self) -> List[str]:
+        now = time.time()
+        abandoned = "SELECT job_id FROM job_tasks WHERE status = 'running' AND lease_expires < ? AND attempts >= ?"
+        if self._db.connect().execute(abandoned + " LIMIT 1", (now, self.max_attempts)).fetchone() is None:
+            return []
+        with self._db.write() as conn:
+            rows = conn.execute(abandoned, (now, self.max_attempts)).fetchall()
+            conn.executemany(
+                "UPDATE job_tasks SET status = 'failed', error = 'lease expired', updated_at = ? WHERE job_id = ?",
+                ((now, row[0]) for row in rows),
+            )
+        return [row[0] for row in rows]
+
+    def active(self, job_id: str) -> bool:
+        row = self._db.connect().execute(
+            "SELECT 1 FROM job_tasks WHERE job_id = ? AND (status = 'queued' OR "
+            "(status = 'running' AND (lease_expires >= ? OR attempts < ?)))",
+            (job_id, time.time(), self.max_attempts),
+        ).fetchone()
+        return row is not None
+
+    def position(self, job_id: str) -> Optional[int]:
+        rotation = self._rotation(self._db.connect())
+        mine = next((i for i, line in enumerate(rotation) if job_id in line), None)
+        if mine is None:
+            return None
+        turn = rotation[mine].index(job_id)
+        # Every round serves one task per client in rotation order, so clients before ours get one more
+        return turn + sum(min(len(line), turn + 1 if i < mine else turn) for i, line in enumerate(rotation) if i != mine)
+
+    def backlog(self, client: str) -> Tuple[int, int, int]:
+        queued, running, client_queued = self._db.connect().execute(
+            "SELECT COALESCE(SUM(status = 'queued'), 0), COALESCE(SUM(status = 'running'), 0), "
+            "COALESCE(SUM(status = 'queued' AND client = ?), 0) FROM job_tasks WHERE status IN ('queued', 'running')",
+            (client,),
+        ).fetchone()
+        return queued, running, client_queued
+
+    def average_seconds(self, recent: int = 50) -> Optional[float]:
+        return self._db.connect().execute(
+            "SELECT AVG(updated_at - started_at) FROM (SELECT updated_at, started_at FROM job_tasks "
+            "WHERE status = 'done' AND started_at IS NOT NULL ORDER BY updated_at DESC LIMIT ?)",
+            (recent,),
+        ).fetchone()[0]
+
+
+def open_task_queue(backend: str, path: Path, max_attempts: int = 3) -> TaskQueue:
+    if backend == "sqlite":
+        return SQLiteTaskQueue(path, max_attempts)
+    raise ValueError(f"Unknown task queue backend: {backend}")
@@ -0,0 +1,84 @@
+import copy
+
+from answers import LETTERS, answer_counts, balance_answers
+
+
+def _question(idx, correct, explanation=None):
+    return {
+        "id": idx,
+        "question": f"Question {idx}?",
+        "options": {letter: f"option {letter.lower()} of {idx}" for letter in LETTERS},
+        "correct_answer": correct,
+        "explanation": explanation if explanation is not None else f"Because of {idx}.",
+    }
+
+
+def _questions(letters):
+    return [_question(idx, letter) for idx, letter in enumerate(letters, start=1)]
+
+
+def test_all_same_letter_is_spread_evenly():
+    questions = _questions("A" * 8)
+    moved = balance_answers(questions)
+    assert moved == 6
+    assert answer_counts(questions) == {"A": 2, "B": 2, "C": 2, "D": 2}
+
+
+def test_remainder_goes_to_the_most_common_letters():
+    questions = _questions("A" * 29 + "B")
+    moved = balance_answers(questions)
+    # 30 = 4 * 7 + 2: the two extra places go to A and B, which already lead
+    assert answer_counts(questions) == {"A": 8, "B": 8, "C": 7, "D": 7}
+    assert moved == 21
+
+
+def test_balanced_input_is_left_alone():
+    questions = _questions("ABCD" * 3)
+    before = copy.deepcopy(questions)
+    assert balance_answers(questions) == 0
+    assert questions == before
+
+
+def test_correct_option_text_survives_the_swap():
+    questions = _questions("A" * 10 + "B" * 5 + "C")
+    correct_text = {q["id"]: q["options"][q["correct_answer"]] for q in questions}
+    option_texts = {q["id"]: sorted(q["options"].values()) for q in questions}
+    balance_answers(questions)
+    for q in questions:
+        assert q["options"][q["correct_answer"]] == correct_text[q["id"]]
+        assert sorted(q["options"].values()) == option_texts[q["id"]]
+
+
+def test_only_the_correct_option_and_its_new_letter_swap():
+    questions = _questions("A" * 8)
+    before = copy.deepcopy(questions)
+    balance_answers(questions)
+    for q, old in zip(questions, before):
+        changed = {letter for letter in LETTERS if q["options"][letter] != old["options"][letter]}
+        assert changed == ({"A", q["correct_answer"]} if q["correct_answer"] != "A" else set())
+
+
+def test_questions_naming_a_letter_are_moved_last():
+    questions = _questions("A" * 8)
+    for idx in (2, 5):
+        questions[idx]["explanation"] = "As stated in option A, this is correct."
+    balance_answers(questions)
+    # Six of the eight must move; the two whose explanation names "option A" are the ones kept
+    assert questions[2]["correct_answer"] == "A"
+    assert questions[5]["correct_answer"] == "A"
+    assert answer_counts(questions) == {"A": 2, "B": 2, "C": 2, "D": 2}
+
+
+def test_same_seed_gives_the_same_result():
+    questions = _questions("A" * 20 + "B" * 7 + "D" * 3)
+    first, second = copy.deepcopy(questions), copy.deepcopy(questions)
+    balance_answers(first, seed=7)
+    balance_answers(second, seed=7)
+    assert first == second
+
+
+def test_fewer_than_two_questions_are_untouched():
+    assert balance_answers([]) == 0
+    single = _questions("C")
+    assert balance_answers(single) == 0
+    assert single[0]["correct_answer"] == "C"
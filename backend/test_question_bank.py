@@ -0,0 +1,60 @@
+import asyncio
+import contextlib
+import io
+import time
+
+import pytest
+
+import bench  # configures the app for an in-memory job store before main is imported
+import main
+from cache import DiskCache
+from llm import LLMDispatcher
+from questionbank import SQLiteQuestionBank
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    transport = bench.FakeLLMTransport(latency=0.0, jitter=0.0)
+    dispatcher = LLMDispatcher(
+        api_key="test",
+        base_url="http://fake-llm.invalid/v1",
+        tokens_per_minute=10 ** 9,
+        cache=DiskCache(tmp_path / "llm", 64 * 1024 * 1024),
+        cache_mode="readwrite",
+        transport=transport,
+    )
+    dispatcher.observers.append(main._record_llm_call)
+    monkeypatch.setattr(main, "_llm", dispatcher)
+    monkeypatch.setattr(main, "BANK", SQLiteQuestionBank(tmp_path / "questions.db"))
+    monkeypatch.setattr(main, "TEXT_DIR", tmp_path)
+    monkeypatch.setattr(main, "OUTPUT_DIR", tmp_path)
+    return transport
+
+
+def _run_job(text, n_questions, question_bank):
+    job_id = f"test-{n_questions}-{question_bank}-{time.monotonic_ns()}"
+    main.JOBS.create(job_id, {"status": "in_progress", "progress": 0, "step": 1, "topics": [], "start_time": time.time(), "done": False})
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(main._generate_async(job_id, text, "English", "English", n_questions, "json",
+                                             content_hash="same-document", question_bank=question_bank))
+        return main.JOBS.get(job_id, include_logs=False)
+    finally:
+        main.JOBS.delete(job_id)
+
+
+@pytest.mark.parametrize("question_bank", ["reuse", "new"])
+def test_repeat_jobs_on_one_document_keep_getting_new_questions(app, question_bank):
+    text = bench.synthetic_document(5)
+    asked = set()
+    for run in range(1, 9):
+        n_questions = 10 * run if question_bank == "reuse" else 10
+        job = _run_job(text, n_questions, question_bank)
+        questions = [q["question"] for q in job["questions"]]
+        assert job["status"] == "completed"
+        assert len(questions) == n_questions
+        if question_bank == "new":
+            # Banked questions are never asked again, so every run must reach the LLM for fresh ones
+            assert not asked & set(questions)
+        asked.update(questions)
+    assert app.requests["questions"] > 0
@@ -0,0 +1,105 @@
+import re
+from collections import Counter
+from typing import Callable, List, Optional
+
+import numpy as np
+
+Embedder = Callable[[List[str]], np.ndarray]
+
+_WORD = re.compile(r"\w{3,}", re.UNICODE)
+
+
+def tfidf_vectors(texts: List[str], max_features: int = 4096, max_df: float = 0.8) -> np.ndarray:
+    """L2-normalised TF-IDF matrix (one row per text) over the most common informative words."""
+    docs = [Counter(_WORD.findall(text.lower())) for text in texts]
+    df = Counter(word for doc in docs for word in doc)
+    limit = max(1, int(max_df * len(texts))) if len(texts) > 2 else len(texts)
+    vocab = [word for word, count in df.most_common() if count <= limit][:max_features]
+    column = {word: i for i, word in enumerate(vocab)}
+
+    matrix = np.zeros((len(texts), len(vocab)), dtype=np.float32)
+    for row, doc in enumerate(docs):
+        for word, count in doc.items():
+            col = column.get(word)
+            if col is not None:
+                matrix[row, col] = 1.0 + np.log(count)
+    if vocab:
+        idf = np.log((1 + len(texts)) / (1 + np.array([df[w] for w in vocab], dtype=np.float32))) + 1.0
+        matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Spherical k-means with k-means++ seeding. Returns a cluster label per row."""
+    rng = np.random.RandomState(seed)
+    n = len(vectors)
+    centroids = [vectors[rng.randint(n)]]
+    distance = 1.0 - vectors @ centroids[0]
+    for _ in range(1, k):
+        weights = np.clip(distance, 0, None).astype(np.float64) ** 2
+        total = weights.sum()
+        idx = rng.choice(n, p=weights / total) if total > 0 else rng.randint(n)
+        centroids.append(vectors[idx])
+        distance = np.minimum(distance, 1.0 - vectors @ vectors[idx])
+    centroids = np.array(centroids)
+
+    labels = np.zeros(n, dtype=int)
+    for iteration in range(iterations):
+        new_labels = np.argmax(vectors @ centroids.T, axis=1)
+        if iteration and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = vectors[labels == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                norm = np.linalg.norm(centroid)
+                centroids[c] = centroid / norm if norm else centroid
+    return labels
+
+
+class TopicIndex:
+    """Per-document clustering of chunks into topics, used to schedule generation batches.
+
+    Chunks are embedded (TF-IDF by default, or any ``embed`` callable returning
+    one vector per chunk) and grouped with k-means. ``next_chunks`` then hands
+    out chunk indices so every topic is drawn from in proportion to its size.
+    Within a topic, chunks are visited from the most representative outward.
+    State carries across calls, so top-up rounds go to chunks not used yet.
+    """
+
+    def __init__(self, chunks: List[str], n_topics: Optional[int] = None, embed: Optional[Embedder] = None):
+        n = len(chunks)
+        if n_topics is None:
+            n_topics = int(round(np.sqrt(n / 2)))
+        n_topics = max(1, min(n_topics, n))
+
+        vectors = embed(chunks) if embed is not None else tfidf_vectors(chunks)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        labels = _kmeans(vectors, n_topics) if n_topics > 1 else np.zeros(n, dtype=int)
+
+        self.topics: List[List[int]] = []
+        for c in range(n_topics):
+            members = np.flatnonzero(labels == c)
+            if not len(members):
+                continue
+            centroid = vectors[members].mean(axis=0)
+            order = np.argsort(-(vectors[members] @ centroid), kind="stable")
+            self.topics.append([int(i) for i in members[order]])
+        self._served = [0] * len(self.topics)
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+    def next_chunks(self, count: int) -> List[int]:
+        """Return ``count`` chunk indices, keeping each topic's share proportional to its size."""
+        picks = []
+        for _ in range(count):
+            topic = min(range(len(self.topics)), key=lambda t: (self._served[t] / len(self.topics[t]), -len(self.topics[t])))
+            members = self.topics[topic]
+            picks.append(members[self._served[topic] % len(members)])
+            self._served[topic] += 1
+        return picks
@@ -0,0 +1,132 @@
+"""Generation worker for WORKER_MODE=queue.
+
+Claims queued jobs from the shared task queue and runs their extraction and
+generation stages outside the web process:
+
+    WORKER_MODE=queue python worker.py --processes 4 --jobs-per-process 2
+
+Each claimed job is held under a lease that is renewed every third of
+TASK_LEASE_SECONDS. If a worker dies, the lease runs out and another worker
+picks the job up, keeping the batches it had already finalized. SIGTERM and
+SIGINT hand running jobs straight back to the queue.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import uuid
+
+import main
+from taskqueue import Task
+
+POLL_SECONDS = float(os.environ.get("WORKER_POLL_SECONDS", "1.0"))
+MAX_POLL_SECONDS = float(os.environ.get("WORKER_MAX_POLL_SECONDS", "5.0"))  # poll interval reached by doubling while the queue stays empty
+
+
+async def _run_task(task: Task) -> None:
+    if task.attempts > 1:
+        # Extraction (if it runs again) counts pages from zero
+        await asyncio.to_thread(main.JOBS.update, task.job_id, status="in_progress", pages_done=0, pages_total=0)
+        await asyncio.to_thread(main.JOBS.append_log, task.job_id, f"Resumed by a worker (attempt {task.attempts})")
+    await main._run_job(task.job_id, task.payload)
+
+
+async def _keep_lease(task: Task, worker_id: str, run: asyncio.Task) -> None:
+    """Renew the lease until the job ends; cancel the job if the lease was lost to another worker."""
+    while True:
+        await asyncio.sleep(main.TASK_LEASE_SECONDS / 3)
+        held = await asyncio.to_thread(main.QUEUE.heartbeat, task.job_id, worker_id, main.TASK_LEASE_SECONDS)
+        if not held:
+            print(f"Worker {worker_id}: lost lease on job {task.job_id}, stopping it")
+            run.cancel()
+            return
+
+
+def _fail_abandoned() -> None:
+    for job_id in main.QUEUE.reap():
+        error_msg = "Job abandoned: its worker stopped responding too many times"
+        if main.JOBS.exists(job_id):
+            main.JOBS.update(job_id, status="error", progress=100, error=error_msg)
+            main.JOBS.append_log(job_id, error_msg)
+            main.JOBS.append_event(job_id, "end", {"status": "error", "error": error_msg})
+
+
+async def _worker_loop(worker_id: str, stopping: asyncio.Event) -> None:
+    poll_seconds = POLL_SECONDS
+    while not stopping.is_set():
+        await asyncio.to_thread(_fail_abandoned)
+        task = await asyncio.to_thread(main.QUEUE.claim, worker_id, main.TASK_LEASE_SECONDS)
+        if task is None:
+            try:
+                await asyncio.wait_for(stopping.wait(), poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            poll_seconds = min(poll_seconds * 2, max(MAX_POLL_SECONDS, POLL_SECONDS))
+            continue
+        poll_seconds = POLL_SECONDS
+
+        run = asyncio.create_task(_run_task(task))
+        lease = asyncio.create_task(_keep_lease(task, worker_id, run))
+        stop = asyncio.create_task(stopping.wait())
+        try:
+            await asyncio.wait({run, stop}, return_when=asyncio.FIRST_COMPLETED)
+            if not run.done():
+                # Shutting down: give the job back so another worker resumes it right away
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+                await asyncio.to_thread(main.QUEUE.release, task.job_id, worker_id)
+                continue
+            try:
+                run.result()
+            except asyncio.CancelledError:
+                pass  # lease lost; the worker now holding it carries on
+            except Exception as exc:
+                await asyncio.to_thread(main.QUEUE.fail, task.job_id, worker_id, str(exc))
+            else:
+                await asyncio.to_thread(main.QUEUE.complete, task.job_id, worker_id)
+        finally:
+            lease.cancel()
+            stop.cancel()
+
+
+async def serve(jobs_per_process: int) -> None:
+    if main.QUEUE is None:
+        raise SystemExit("worker.py needs WORKER_MODE=queue")
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    await asyncio.gather(*(_worker_loop(f"{prefix}-{uuid.uuid4().hex[:6]}", stopping) for _ in range(jobs_per_process)))
+
+
+def _serve_process(jobs_per_process: int) -> None:
+    asyncio.run(serve(jobs_per_process))
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description="Run generation workers for WORKER_MODE=queue")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to start")
+    parser.add_argument("--jobs-per-process", type=int, default=2, help="jobs each process runs at a time")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        _serve_process(args.jobs_per_process)
+        return
+    # Spawn rather than fork so no process inherits another's SQLite connections or HTTP client
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_serve_process, args=(args.jobs_per_process,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main_cli()
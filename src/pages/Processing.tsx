@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate, useLocation } from 'react-router-dom';
 import Navigation from '../components/Navigation';
 import { Button } from '@/components/ui/button';
@@ -31,8 +31,11 @@ const Processing: React.FC = () => {
   const [currentStep, setCurrentStep] = useState(0);
   const [progress, setProgress] = useState(0);
   const [estimatedTime, setEstimatedTime] = useState(60);
+  const [queuePosition, setQueuePosition] = useState<number | null>(null);
   const [logs, setLogs] = useState<string[]>([]);
   const [error, setError] = useState<string | null>(null);
+  // Cursor of the last log line received, so each poll only returns new lines
+  const logCursor = useRef<number | null>(null);
 
   const steps: ProcessStep[] = [
     {
@@ -80,11 +83,13 @@ const Processing: React.FC = () => {
     }
 
     try {
-      const response = await fetch(`${import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'}/jobs/${state.jobId}`);
+      const cursorParam = logCursor.current !== null ? `?log_cursor=${logCursor.current}` : '';
+      const response = await fetch(`${import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'}/jobs/${state.jobId}${cursorParam}`);
       if (!response.ok) {
         throw new Error('Failed to fetch job status');
       }
       const data = await response.json();
+      logCursor.current = data.log_cursor ?? logCursor.current;
       
       // Update logs with detailed status information
       let statusLog = `Status: ${data.status || 'unknown'} - ${data.progress}% complete`;
@@ -121,6 +126,7 @@ const Processing: React.FC = () => {
       setProgress(data.progress || 0);
       setCurrentStep(data.step || 0);
       setEstimatedTime(data.eta || 0);
+      setQueuePosition(data.queue_position ?? null);
       
       // Set timeout for next poll
       const timeoutId = setTimeout(() => pollStatus(), 2000);
@@ -157,14 +163,62 @@ const Processing: React.FC = () => {
   };
 
   useEffect(() => {
-    // Start polling
-    pollStatus();
+    if (!state?.jobId || typeof EventSource === 'undefined') {
+      // Fall back to polling
+      pollStatus();
+      return;
+    }
+
+    // Subscribe to pushed job events; the browser resumes from Last-Event-ID on reconnect
+    const events = new EventSource(`${import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'}/jobs/${state.jobId}/events`);
+
+    // The ETA and queue position are computed per status request, not pushed, so poll them slowly alongside
+    const refreshEstimate = async () => {
+      try {
+        const response = await fetch(`${import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'}/jobs/${state.jobId}?log_limit=1`);
+        if (!response.ok) {
+          return;
+        }
+        const data = await response.json();
+        setEstimatedTime(data.eta || 0);
+        setQueuePosition(data.queue_position ?? null);
+      } catch {
+        // The event stream carries progress; a missed estimate is refreshed on the next tick
+      }
+    };
+    refreshEstimate();
+    const estimateTimer = setInterval(refreshEstimate, 10000);
+
+    events.addEventListener('progress', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      setProgress(data.progress || 0);
+      setCurrentStep(data.step || 0);
+    });
+
+    events.addEventListener('log', (event) => {
+      const message = JSON.parse((event as MessageEvent).data);
+      setLogs((prev) => [...prev, message]);
+    });
+
+    events.addEventListener('end', () => {
+      events.close();
+      clearInterval(estimateTimer);
+      // One final status fetch handles navigation or the error view
+      pollStatus();
+    });
+
+    events.onerror = () => {
+      if (events.readyState === EventSource.CLOSED) {
+        clearInterval(estimateTimer);
+        pollStatus();
+      }
+    };
 
-    // Return cleanup function
     return () => {
-      // No timeoutId to clean up since it's handled in pollStatus
+      events.close();
+      clearInterval(estimateTimer);
     };
-  }, [navigate, state, setError, setLogs, setCurrentStep, setProgress, setEstimatedTime]);
+  }, [navigate, state, setError, setLogs, setCurrentStep, setProgress, setEstimatedTime, setQueuePosition]);
 
   if (error) {
     return (
@@ -241,6 +295,12 @@ const Processing: React.FC = () => {
                   <Progress value={progress} className="h-3" />
                 </div>
 
+                {queuePosition !== null && (
+                  <div className="flex items-center space-x-2 text-sm text-gray-600">
+                    <Clock className="h-4 w-4" />
+                    <span>Waiting in queue: position {queuePosition}</span>
+                  </div>
+                )}
                 {estimatedTime > 0 && (
                   <div className="flex items-center space-x-2 text-sm text-gray-600">
                     <Clock className="h-4 w-4" />
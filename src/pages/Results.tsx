@@ -49,14 +49,24 @@ const Results: React.FC = () => {
           return;
         }
 
-        const response = await fetch(`${import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'}/jobs/${jobId}`);
-        if (!response.ok) {
-          throw new Error('Failed to fetch job status');
+        // Page through all questions, not just the preview
+        const allQuestions: Question[] = [];
+        const pageSize = 500;
+        let total = Infinity;
+        while (allQuestions.length < total) {
+          const response = await fetch(
+            `${import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'}/jobs/${jobId}/questions?offset=${allQuestions.length}&limit=${pageSize}`
+          );
+          if (!response.ok) {
+            throw new Error('Failed to fetch questions');
+          }
+          const data = await response.json();
+          total = data.total;
+          if (!data.questions || data.questions.length === 0) {
+            break;
+          }
+          allQuestions.push(...data.questions);
         }
-        const data = await response.json();
-        
-        // Get all questions, not just the preview
-        const allQuestions = data.questions || [];
         setQuestions(allQuestions);
       } catch (error) {
         console.error("Error fetching questions:", error);
@@ -76,29 +86,24 @@ const Results: React.FC = () => {
       return;
     }
 
-    // Use the questions we already have
-    const allQuestions = questions;
     const filename = `questions_${state?.filename?.replace(/\.[^/.]+$/, "") || 'generated'}.${format === 'json' ? 'json' : 'xlsx'}`;
-    console.log(`Downloading ${filename} with ${allQuestions.length} questions`);
-    
-    // Format for Excel
-    const excelData = format === 'excel' ? allQuestions.map(q => ({
-      ...q,
-      correct_answer: q.correct_answer, // No need to convert to A-D
-      options: Object.values(q.options).join(', ') // Join options for Excel
-    })) : allQuestions;
 
-    const blob = new Blob([JSON.stringify(excelData, null, 2)], { 
-      type: format === 'json' ? 'application/json' : 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' 
-    });
-    const url = URL.createObjectURL(blob);
     const a = document.createElement('a');
-    a.href = url;
+    if (format === 'excel') {
+      // The backend streams a real workbook
+      a.href = `${import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'}/jobs/${jobId}/export?format=xlsx`;
+    } else {
+      // Use the questions we already have
+      console.log(`Downloading ${filename} with ${questions.length} questions`);
+      a.href = URL.createObjectURL(new Blob([JSON.stringify(questions, null, 2)], { type: 'application/json' }));
+    }
     a.download = filename;
     document.body.appendChild(a);
     a.click();
     document.body.removeChild(a);
-    URL.revokeObjectURL(url);
+    if (format === 'json') {
+      URL.revokeObjectURL(a.href);
+    }
   };
 
   if (!state) {